@@ -1,24 +1,34 @@
 import streamlit as st
-import pandas as pd
+import streamlit.components.v1 as components
 from datetime import datetime
-import io
-import zipfile
+import hashlib
+import json
 import os
+import time
 from pathlib import Path
 
-# Fix Sync Gap: Force Python to reload the modules
-import importlib
-import modules.report_performance
-import modules.report_generali
-import modules.report_axa
+from modules.archive import archive_reader
+from modules.assets import data_uri
+from modules.pdf_cache import PdfCache
+from modules.ingest import load_upload, partition_csv, sniff_upload, streamable
+from modules.jobs import BatchFile, BatchJob, MultiBatchJob, share_workers
+from modules.manifest import IncrementalOutput, OutputBusy, default_output_dir
+from modules.metrics import RunMetrics
+from modules.registry import (
+    REPORTS_BY_NAME, agent_rows, detect_report, load_generator, rows_estimate, sniff_report,
+)
+from modules.settings import DEFAULT_PDF_BACKEND, DEFAULT_PDF_PROFILE, LARGE_AGENT_ROWS, PDF_PROFILES, available_backends
+from modules.task_queue import TaskQueue, default_queue_dir
 
-importlib.reload(modules.report_performance)
-importlib.reload(modules.report_generali)
-importlib.reload(modules.report_axa)
+# Report modules (and WeasyPrint) are imported on first use and then kept across reruns.
+# Set ATLAS_DEV_RELOAD=1 while editing them to re-execute the detected one on every rerun.
+DEV_RELOAD = os.environ.get("ATLAS_DEV_RELOAD") == "1"
 
-from modules.report_performance import generate_performance_pdfs
-from modules.report_generali import generate_generali_pdfs
-from modules.report_axa import generate_axa_pdfs
+# How often the progress panel of a running batch refreshes
+PROGRESS_REFRESH_SECONDS = 1.0
+
+# Height of the HTML and PDF views of a single-agent preview
+PREVIEW_HEIGHT = 600
 
 st.set_page_config(page_title="Atlas Report Generator", page_icon="📊", layout="wide")
 st.title("📊 Atlas Client Report Generator")
@@ -33,68 +43,461 @@ else:
     st.sidebar.error(f"⚠️ Logo not found at: {logo_file}")
     logo_to_use = ""
 
+@st.cache_resource
+def get_pdf_cache():
+    return PdfCache()
+
+pdf_cache = get_pdf_cache()
+
 st.sidebar.header("Report Settings")
 report_date = st.sidebar.date_input("Report Display Date", datetime.today())
+render_workers = st.sidebar.number_input(
+    "Render Workers", min_value=1, max_value=os.cpu_count() or 1, value=os.cpu_count() or 1,
+    help="Number of processes rendering agent PDFs in parallel"
+)
+large_agent_rows = st.sidebar.number_input(
+    "Large-Agent Threshold (rows)", min_value=0, value=LARGE_AGENT_ROWS, step=100,
+    help="Agents with more rows are laid out in chunks and joined into one PDF (0 disables)"
+)
+compress_zip = st.sidebar.checkbox(
+    "Compress ZIP", value=False,
+    help="PDFs are already compressed; deflating them again costs CPU for almost no size gain"
+)
+backends = available_backends()
+pdf_backend = st.sidebar.selectbox(
+    "PDF Renderer", backends,
+    index=backends.index(DEFAULT_PDF_BACKEND) if DEFAULT_PDF_BACKEND in backends else 0,
+    help="weasyprint renders the HTML templates; reportlab draws the same tables directly and is "
+         "much faster on large uploads (pip install reportlab)"
+)
+pdf_profile = st.sidebar.selectbox(
+    "Output Profile", PDF_PROFILES, index=PDF_PROFILES.index(DEFAULT_PDF_PROFILE),
+    help="compact resamples images to print resolution and embeds lean font subsets, "
+         "for batches sent by mail or through the file share"
+)
+incremental = st.sidebar.checkbox(
+    "Incremental Mode", value=False,
+    help="Re-render only agents whose data changed since the last run of this report type; "
+         "unchanged PDFs are reused and departed agents dropped"
+)
 
-# --- File Upload ---
-uploaded_file = st.file_uploader("Upload Excel or CSV File", type=['csv', 'xlsx'])
+stream_csv = st.sidebar.checkbox(
+    "Stream CSV Uploads", value=False,
+    help="Read Generali and Performance CSVs in chunks into per-agent spill files on disk and render "
+         "one agent at a time, so memory follows the largest agent instead of the whole file"
+)
+use_queue = st.sidebar.checkbox(
+    "Render Queue", value=False,
+    help=f"Hand agent layouts to worker.py processes (on this or other hosts) watching {default_queue_dir()} "
+         "instead of rendering here; set ATLAS_QUEUE_DIR to a shared volume for several hosts"
+)
+
+@st.cache_resource
+def get_task_queue():
+    return TaskQueue()
+
+render_queue = get_task_queue() if use_queue else None
+if render_queue is not None:
+    with st.sidebar.expander("Render Queue Status"):
+        queue_batches = render_queue.batches()
+        if not queue_batches:
+            st.write("No batches queued")
+        for queue_batch in queue_batches:
+            open_tasks = queue_batch["pending"] + queue_batch["claimed"]
+            st.write(f"{queue_batch.get('report_type') or '-'} ({queue_batch.get('host', '?')}): "
+                     f"{queue_batch['done']} done · {open_tasks} open · {queue_batch['failed']} failed")
+
+with st.sidebar.expander("PDF Cache"):
+    cache_stats = pdf_cache.stats()
+    st.write(f"Hits: {cache_stats['hits']} · Misses: {cache_stats['misses']}")
+    st.write(f"Size: {cache_stats['bytes'] / 1024 / 1024:.1f} MB")
+    if st.button("Clear PDF Cache"):
+        pdf_cache.clear()
+
+@st.fragment(run_every=PROGRESS_REFRESH_SECONDS)
+def job_progress(job, label, report_type, report_date):
+    """Live progress of a background batch; only this fragment reruns while it polls"""
+    if not job.running:
+        st.rerun()  # finished or cancelled: rerun the whole app to show the results
+
+    done, total, remaining = job.progress()
+    status = f"{label} {done}/{total} agents" if total else label
+    if remaining is not None:
+        status += f" · ~{remaining:.0f} s left"
+    st.progress(min(done / total, 1.0) if total else 0.0, text=status)
+
+    cancel_col, download_col = st.columns(2)
+    if cancel_col.button("⏹️ Cancel", disabled=job.cancelling):
+        job.cancel()
+    if job.files:
+        download_col.download_button(
+            label=f"📥 Download {len(job.files)} Finished Reports (ZIP)",
+            data=job.partial_zip,
+            file_name=f"{report_type}_Reports_{report_date.strftime('%Y%m%d')}_partial.zip",
+            mime="application/zip",
+            on_click="ignore",
+        )
 
-if uploaded_file is not None:
+def start_batch(uploads, logo_url, report_date, workers, incremental, compress, **render_options):
+    """
+    Starts one MultiBatchJob over the recognized uploads, given as (file name, ReportFormat,
+    report data, parse seconds). Each file gets its own generator, metrics and share of the
+    render workers. With several files, each one's PDFs go into a ZIP folder named after its report type.
+    """
+    report_types = [report.name for _, report, _, _ in uploads]
+    files = []
+    outputs = []
     try:
-        # CRITICAL CHANGE: sheet_name=None reads ALL sheets into a Dictionary
-        if uploaded_file.name.endswith('.csv'):
-            data_source = pd.read_csv(uploaded_file)
+        for (name, report, report_data, parse_seconds), file_workers in zip(
+            uploads, share_workers(workers, len(uploads))
+        ):
+            run_metrics = RunMetrics()
+            run_metrics.add("parse", parse_seconds)
+            render_errors = []
+            output = None
+            options = dict(render_options, workers=file_workers, errors=render_errors, metrics=run_metrics)
+            if incremental:
+                # Last run's PDFs and manifest for this report type, kept between sessions
+                # (raises OutputBusy while another session's run of the type is going)
+                output = IncrementalOutput(default_output_dir(report.name))
+                outputs.append(output)
+                options["manifest"] = output
+            # The generators are lazy: nothing renders until the job consumes them
+            generate = load_generator(report, reload=DEV_RELOAD)
+            pdfs = generate(report_data, logo_url, report_date, **options)
+
+            if len(uploads) == 1:
+                folder = ""
+            elif report_types.count(report.name) == 1:
+                folder = report.name
+            else:
+                folder = f"{report.name}/{Path(name).stem}"
+            job = BatchJob(pdfs, run_metrics, render_errors, output, compress, archive=False)
+            files.append(BatchFile(name, report.name, folder, job))
+    except Exception:
+        # Nothing started: give back the output folders taken so far
+        for output in outputs:
+            output.close()
+        raise
+    return MultiBatchJob(files, compress).start()
+
+def start_preview(report, report_data, agent, logo_url, report_date, **render_options):
+    """
+    Renders one agent of an upload on a background thread, through the same generate_*_pdfs as
+    the full batch. Returns the job's state for the preview panel: its HTML arrives in "previews"
+    as soon as the template is rendered, well before the PDF.
+    """
+    previews = []
+    run_metrics = RunMetrics()
+    render_errors = []
+    generate = load_generator(report, reload=DEV_RELOAD)
+    pdfs = generate(
+        report_data, logo_url, report_date, workers=1, errors=render_errors, metrics=run_metrics,
+        agents=[agent], previews=previews, **render_options
+    )
+    job = BatchJob(pdfs, run_metrics, render_errors, archive=False).start()
+    return {"job": job, "previews": previews, "agent": agent}
+
+def show_preview(preview, logo_url):
+    """The previewed agent's HTML (logo inlined, so the browser can show it) and, once rendered, its PDF"""
+    job = preview["job"]
+    html_tab, pdf_tab = st.tabs(["HTML", "PDF"])
+    with html_tab:
+        if preview["previews"]:
+            _, html = preview["previews"][0]
+            if logo_url:
+                html = html.replace(logo_url, data_uri(logo_url))
+            components.html(html, height=PREVIEW_HEIGHT, scrolling=True)
+        elif job.running:
+            st.caption("Rendering the template...")
         else:
-            data_source = pd.read_excel(uploaded_file, sheet_name=None)
-
-        st.success(f"Loaded '{uploaded_file.name}'")
-        generated_pdfs = []
-        report_type = ""
-
-        # ROUTING LOGIC
-        # 1. Check if it's the multi-sheet AXA file
-        if isinstance(data_source, dict) and 'Contratos' in data_source and 'Clientes' in data_source:
-            st.info("🎯 **Detected Format:** AXA Report (Multi-sheet)")
-            with st.spinner("Generando Reportes AXA..."):
-                generated_pdfs = generate_axa_pdfs(data_source, logo_to_use, report_date)
-            report_type = "AXA"
-            
+            st.caption("No HTML for this agent: its PDF was drawn by reportlab, or its template failed.")
+    with pdf_tab:
+        if job.running:
+            st.caption("Laying out the PDF...")
+        elif job.status == "failed":
+            st.error(f"🚨 Error: {job.error}")
+        elif job.errors:
+            for agent, message in job.errors:
+                st.error(f"🚨 {agent}: {message}")
+        elif not job.files:
+            st.warning(f"⚠️ No report for {preview['agent']} (e.g. no active contracts).")
         else:
-            # 2. Extract standard single-sheet Data
-            df = list(data_source.values())[0] if isinstance(data_source, dict) else data_source
-            cols_lower = [str(c).lower().strip() for c in df.columns]
-
-            if 'contract id' in cols_lower:
-                st.info("🎯 **Detected Format:** Generali Performance")
-                df.columns = cols_lower 
-                with st.spinner("Generating Generali Reports..."):
-                    generated_pdfs = generate_generali_pdfs(df, logo_to_use, report_date)
-                report_type = "Generali"
-
-            elif 'account number' in cols_lower:
-                st.info("🎯 **Detected Format:** Standard Performance")
-                with st.spinner("Generating Performance Reports..."):
-                    generated_pdfs = generate_performance_pdfs(df, logo_to_use, report_date)
-                report_type = "Performance"
+            filename, pdf_bytes = next(job.finished())
+            st.pdf(pdf_bytes, height=PREVIEW_HEIGHT)
+            st.download_button(
+                "📥 Download Preview PDF", data=pdf_bytes, file_name=filename, mime="application/pdf", on_click="ignore"
+            )
 
-            else:
-                st.error("❌ Format Not Recognized.")
+@st.fragment(run_every=PROGRESS_REFRESH_SECONDS)
+def preview_progress(preview, logo_url):
+    """show_preview while the agent renders; only this fragment reruns while it polls"""
+    if not preview["job"].running:
+        st.rerun()
+    show_preview(preview, logo_url)
+
+# --- File Upload ---
+uploaded_files = st.file_uploader("Upload Excel or CSV Files", type=['csv', 'xlsx'], accept_multiple_files=True)
+
+if uploaded_files:
+    try:
+        # Streamlit reruns this script on every interaction: sniff and parse each upload only once per session
+        upload_hashes = [hashlib.sha256(uploaded_file.getvalue()).hexdigest() for uploaded_file in uploaded_files]
+        sniffed_uploads = st.session_state.setdefault("sniffed_uploads", {})
+        parsed_uploads = st.session_state.setdefault("parsed_uploads", {})
+        for session_cache in (sniffed_uploads, parsed_uploads):
+            for removed in set(session_cache) - set(upload_hashes):
+                del session_cache[removed]
+
+        # Recognized uploads as (file name, ReportFormat, report data, parse seconds)
+        ready = []
+        # File name: (upload hash, rows per agent) of the recognized uploads, for the preview
+        upload_agents = {}
+        seen = set()
+        # Uploads named alike (two export.csv from different folders, or export.csv and export.xlsx)
+        # get a short content hash in their name, which also names their ZIP folder
+        stems = [Path(uploaded_file.name).stem for uploaded_file in uploaded_files]
+        for uploaded_file, upload_hash in zip(uploaded_files, upload_hashes):
+            if upload_hash in seen:
+                st.warning(f"⚠️ '{uploaded_file.name}' has the same content as another upload and is skipped.")
+                continue
+            seen.add(upload_hash)
+            name = uploaded_file.name
+            if stems.count(Path(name).stem) > 1:
+                name = f"{Path(name).stem}_{upload_hash[:8]}{Path(name).suffix}"
+
+            # 1. SNIFF: sheet names and header rows only, so unsupported files are rejected before any parsing
+            sniffed = sniffed_uploads.get(upload_hash)
+            if sniffed is None:
+                sheets = sniff_upload(uploaded_file)
+                sniffed_report = sniff_report(sheets)
+                sniffed = sniffed_uploads[upload_hash] = {
+                    "report": sniffed_report.name if sniffed_report else None,
+                    "rows": rows_estimate(sniffed_report, sheets) if sniffed_report else None,
+                }
+
+            if sniffed["report"] is None:
+                st.error(f"❌ '{name}': Format Not Recognized.")
+                continue
+            overview = [REPORTS_BY_NAME[sniffed["report"]].label]
+            if sniffed["rows"] is not None:
+                overview.append(f"~{sniffed['rows']:,} rows")
+            st.info(f"🎯 **{name}:** {' · '.join(overview)}")
+
+            # 2. TARGETED LOAD: only the sheets/columns the sniffed report uses, once per upload
+            # (streamed CSVs are split into per-agent spill files instead of one DataFrame)
+            stream = stream_csv and streamable(uploaded_file, sniffed["report"])
+            parsed = parsed_uploads.get(upload_hash)
+            if parsed is None or parsed["streamed"] != stream:
+                with st.spinner(f"Loading '{name}'..."):
+                    parse_start = time.perf_counter()
+                    if stream:
+                        agent_columns = REPORTS_BY_NAME[sniffed["report"]].agent_columns
+                        data = partition_csv(uploaded_file, sniffed["report"], agent_columns)
+                    else:
+                        data = load_upload(uploaded_file, sniffed["report"])
+                parsed = parsed_uploads[upload_hash] = {
+                    "data": data, "parse_seconds": time.perf_counter() - parse_start, "streamed": stream,
+                }
 
-        # DOWNLOAD SECTION
-        if generated_pdfs:
+            # ROUTING LOGIC
+            report, report_data = detect_report(parsed["data"])
+            if report is None:
+                st.error(f"❌ '{name}': Format Not Recognized.")
+                continue
+            if "agent_rows" not in parsed:
+                parsed["agent_rows"] = agent_rows(report, report_data)
+            # Agents are counted once loaded (see registry.rows_estimate)
+            loaded = f"Loaded '{name}'"
+            if parsed["agent_rows"] is not None:
+                loaded += f": {len(parsed['agent_rows']):,} agents"
+            st.success(loaded)
+            ready.append((name, report, report_data, parsed["parse_seconds"]))
+            upload_agents[name] = (upload_hash, parsed["agent_rows"])
+
+        report_types = list(dict.fromkeys(report.name for _, report, _, _ in ready))
+        if incremental and len(report_types) < len(ready):
+            st.error("❌ Incremental Mode keeps one previous run per report type: upload one file per type.")
+            ready = []
+
+        # PREVIEW (one agent, to check an upload before committing to the full batch)
+        if ready:
+            st.subheader("🔍 Preview One Agent")
+            preview_file = st.selectbox("File", list(upload_agents)) if len(ready) > 1 else ready[0][0]
+            preview_hash, agent_counts = upload_agents[preview_file]
+            if agent_counts is None or agent_counts.empty:
+                st.caption("No agents found in this file.")
+            else:
+                # Largest agent first (the default): the one most likely to show layout problems
+                preview_agent = st.selectbox(
+                    "Agent", list(agent_counts.index), format_func=lambda agent: f"{agent} ({agent_counts[agent]:,} rows)"
+                )
+                preview_key = (
+                    preview_hash, preview_agent, report_date, large_agent_rows, pdf_backend, pdf_profile
+                )
+                preview = st.session_state.get("preview")
+                if preview is not None and preview["key"] != preview_key:
+                    preview = None
+                if st.button(f"👁️ Preview {preview_agent}", disabled=preview is not None and preview["job"].running):
+                    preview_report, preview_data = next(
+                        (report, report_data) for name, report, report_data, _ in ready if name == preview_file
+                    )
+                    preview = start_preview(
+                        preview_report, preview_data, preview_agent, logo_to_use, report_date,
+                        cache=pdf_cache, large_agent_rows=large_agent_rows, backend=pdf_backend, profile=pdf_profile,
+                    )
+                    preview["key"] = preview_key
+                    st.session_state["preview"] = preview
+                if preview is not None:
+                    if preview["job"].running:
+                        preview_progress(preview, logo_to_use)
+                    else:
+                        show_preview(preview, logo_to_use)
             st.divider()
-            zip_buffer = io.BytesIO()
-            with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED, False) as zip_file:
-                for filename, pdf_bytes in generated_pdfs:
-                    zip_file.writestr(filename, pdf_bytes)
-            
-            st.download_button(
-                label=f"📥 Download {len(generated_pdfs)} {report_type} Reports (ZIP)",
-                data=zip_buffer.getvalue(),
-                file_name=f"{report_type}_Reports_{report_date.strftime('%Y%m%d')}.zip",
-                mime="application/zip",
-                type="primary"
+
+        # GENERATION (only on explicit request; the finished ZIP is reused across reruns)
+        if ready:
+            batch_name, batch_title = "_".join(report_types), " + ".join(report_types)
+            spinner_msg = ready[0][1].spinner if len(ready) == 1 else f"Generating reports for {len(ready)} files..."
+            batch_key = (
+                tuple(upload_hashes), report_date, compress_zip, large_agent_rows, incremental, pdf_backend, pdf_profile,
+                use_queue,
             )
+            batch = st.session_state.get("batch")
+            if batch is not None and batch["key"] != batch_key:
+                batch = None
+
+            # A running job belongs to the settings it was started with
+            job_state = st.session_state.get("job")
+            if job_state is not None and job_state["key"] != batch_key:
+                job_state["job"].cancel()
+                st.session_state.pop("job", None)
+                job_state = None
+            job_running = job_state is not None and job_state["job"].running
+
+            start_disabled = job_running or (batch is not None and not batch["cancelled"])
+            if st.button(f"⚙️ Generate {batch_title} Reports", disabled=start_disabled):
+                # Rendering runs on background threads (one per file); this script only polls them
+                try:
+                    job = start_batch(
+                        ready, logo_to_use, report_date, render_workers, incremental, compress_zip,
+                        cache=pdf_cache, large_agent_rows=large_agent_rows, backend=pdf_backend, profile=pdf_profile,
+                        queue=render_queue,
+                    )
+                except OutputBusy:
+                    st.error("❌ Another Incremental Mode run of this report type is in progress. Try again once it finishes.")
+                else:
+                    job_state = {
+                        "key": batch_key, "job": job, "report_type": batch_name, "title": batch_title,
+                        "label": spinner_msg,
+                    }
+                    st.session_state["job"] = job_state
+                    st.session_state.pop("batch", None)
+                    batch = None
+
+            if job_state is not None:
+                job = job_state["job"]
+                if job.running:
+                    job_progress(job, job_state["label"], job_state["report_type"], report_date)
+                elif job.status == "failed":
+                    st.error(f"🚨 Error: {job.error}")
+                    st.session_state.pop("job", None)
+                else:
+                    batch = {
+                        "key": job_state["key"],
+                        "zip": job.zip,
+                        "count": job.count,
+                        "files": job.results(),
+                        "report_type": job_state["report_type"],
+                        "title": job_state["title"],
+                        "cancelled": job.status == "cancelled",
+                    }
+                    st.session_state["batch"] = batch
+                    st.session_state.pop("job", None)
+
+            # RUN METRICS (sidebar summary of the last batch, exportable for monitoring)
+            if batch is not None:
+                file_metrics = {result["file"]: result["metrics"] for result in batch["files"] if result["metrics"]}
+                with st.sidebar.expander("⏱️ Run Metrics", expanded=True):
+                    for file_name, metrics in file_metrics.items():
+                        if len(batch["files"]) > 1:
+                            st.markdown(f"**{file_name}**")
+                        st.write(f"Total: {metrics['wall_seconds']:.1f} s · Agents: {len(metrics['agents'])} "
+                                 f"({metrics['cached_agents']} from cache)")
+                        st.table({"Stage": list(metrics["stages"]), "Seconds": list(metrics["stages"].values())})
+                        if metrics["bytes_per_pdf"] is not None:
+                            st.write(f"Output: {metrics['pdf_bytes'] / 1024 / 1024:.1f} MB · "
+                                     f"{metrics['bytes_per_pdf'] / 1024:.0f} KB per PDF")
+                        if metrics["counts"]:
+                            st.write(" · ".join(f"{name}: {value:,}" for name, value in metrics["counts"].items()))
+                        if metrics["peak_rss_bytes"]:
+                            rss = metrics["peak_rss_bytes"]
+                            st.write(f"Peak RSS: {rss['process'] / 1024 / 1024:.0f} MB "
+                                     f"(render workers: {rss['children'] / 1024 / 1024:.0f} MB)")
+                        slowest = metrics["agents"][:5]
+                        if slowest:
+                            st.caption("Slowest agents")
+                            st.table({
+                                "Agent": [entry["agent"] for entry in slowest],
+                                "Rows": [entry["rows"] for entry in slowest],
+                                "Seconds": [entry["seconds"] for entry in slowest],
+                            })
+                    # One summary per file, keyed by file name when several were uploaded (like cli.py --metrics)
+                    exported = next(iter(file_metrics.values())) if len(batch["files"]) == 1 else file_metrics
+                    st.download_button(
+                        "Export Metrics (JSON)",
+                        data=json.dumps(exported, indent=2, ensure_ascii=False),
+                        file_name=f"{batch['report_type']}_metrics_{report_date.strftime('%Y%m%d')}.json",
+                        mime="application/json",
+                        on_click="ignore",
+                        disabled=not file_metrics,
+                    )
+
+            # DOWNLOAD SECTION
+            if batch is not None:
+                several = len(batch["files"]) > 1
+                if several:
+                    st.caption("Files in this batch")
+                    st.table({
+                        "File": [result["file"] for result in batch["files"]],
+                        "Report": [result["report_type"] for result in batch["files"]],
+                        "Folder": [result["folder"] for result in batch["files"]],
+                        "Status": [result["status"] for result in batch["files"]],
+                        "PDFs": [result["pdfs"] for result in batch["files"]],
+                        "Failures": [len(result["errors"]) for result in batch["files"]],
+                    })
+
+                for result in batch["files"]:
+                    prefix = f"{result['file']}: " if several else ""
+                    if result["status"] == "failed":
+                        st.error(f"🚨 {prefix}{result['error']}")
+                    if result["errors"]:
+                        st.warning(f"⚠️ {prefix}{len(result['errors'])} agent report(s) could not be generated:")
+                        for agent, message in result["errors"]:
+                            st.write(f"- **{agent}**: {message}")
+
+                    # Data issues found while generating (e.g. mediator codes missing from agentes.csv)
+                    for message in (result["metrics"] or {}).get("notes", []):
+                        st.warning(f"⚠️ {prefix}{message}")
+
+                    if result["incremental"]:
+                        changes = result["incremental"]
+                        st.info(f"♻️ {prefix}Incremental run: {changes['written']} re-rendered, "
+                                f"{changes['reused']} unchanged, {changes['removed']} removed")
+
+                if batch["cancelled"]:
+                    st.info(f"⏹️ Cancelled: {batch['count']} finished report(s) kept.")
+
+                if batch["count"]:
+                    st.divider()
+                    st.download_button(
+                        label=f"📥 Download {batch['count']} {batch['title']} Reports (ZIP)",
+                        data=archive_reader(batch["zip"]),
+                        file_name=f"{batch['report_type']}_Reports_{report_date.strftime('%Y%m%d')}.zip",
+                        mime="application/zip",
+                        on_click="ignore",
+                        type="primary"
+                    )
 
     except Exception as e:
         st.error(f"🚨 Error: {e}")
@@ -0,0 +1,221 @@
+"""
+End-to-end throughput benchmark on synthetic inputs:
+
+    python benchmark.py --rows 20000 --agents 60 --workers 8 -o bench.json
+    python benchmark.py --rows 20000 --agents 60 --workers 8 --baseline bench.json
+    python benchmark.py --rows 20000 --agents 60 --workers 8 --backend reportlab
+    python benchmark.py --formats Performance --rows 1000000 --agents 2000 --file-type csv --stream
+
+Each case writes a synthetic upload to disk, then times parsing, PDF generation and ZIP
+writing. Results are saved as JSON. With --baseline, cases that got slower than
+--tolerance allows are listed and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+from cli import LOGO_FILE
+from modules import synthetic
+from modules.archive import write_zip
+from modules.ingest import load_upload, partition_csv, streamable
+from modules.metrics import RunMetrics
+from modules.registry import REPORTS_BY_NAME, detect_report, load_generator
+from modules.settings import DEFAULT_PDF_BACKEND, DEFAULT_PDF_PROFILE, PDF_BACKENDS, PDF_PROFILES
+
+REPORT_DATE = date(2024, 12, 31)
+
+
+def _package_version(name):
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": {name: _package_version(name) for name in ["pandas", "weasyprint", "reportlab", "jinja2", "openpyxl", "python-calamine"]},
+    }
+
+
+def run_case(report_type, rows, agents, workers, file_type, seed, workdir, backend=DEFAULT_PDF_BACKEND,
+             profile=DEFAULT_PDF_PROFILE, stream=False):
+    """
+    Times one full pipeline run (parse -> PDFs -> ZIP) and returns its result record.
+    With `stream`, CSV uploads are split into per-agent spill files instead of loaded whole.
+    """
+    data = synthetic.GENERATORS[report_type](rows, agents, seed=seed)
+    if report_type == "AXA":
+        file_type = "xlsx"
+    path = synthetic.write_input(data, Path(workdir) / f"{report_type.lower()}_{rows}.{file_type}")
+    logo_url = LOGO_FILE.absolute().as_uri() if LOGO_FILE.exists() else ""
+    generate = load_generator(report_type)
+
+    # 1. PARSE
+    start = time.perf_counter()
+    stream = stream and streamable(path, report_type)
+    if stream:
+        data_source = partition_csv(path, report_type, REPORTS_BY_NAME[report_type].agent_columns)
+    else:
+        data_source = load_upload(path)
+    detected, report_data = detect_report(data_source)
+    parse_seconds = time.perf_counter() - start
+    if detected is None or detected.name != report_type:
+        raise RuntimeError(f"{path.name} was not detected as {report_type}")
+
+    # 2. PDFS (no cache: every agent is rendered)
+    errors = []
+    pdfs = []
+    metrics = RunMetrics()
+    start = time.perf_counter()
+    for filename, pdf_bytes in generate(
+        report_data, logo_url, REPORT_DATE, workers=workers, errors=errors, metrics=metrics, backend=backend,
+        profile=profile,
+    ):
+        pdfs.append((filename, pdf_bytes))
+    render_seconds = time.perf_counter() - start
+
+    # 3. ZIP
+    start = time.perf_counter()
+    archive, count = write_zip(iter(pdfs))
+    archive.seek(0, os.SEEK_END)
+    zip_bytes = archive.tell()
+    archive.close()
+    zip_seconds = time.perf_counter() - start
+
+    total = parse_seconds + render_seconds + zip_seconds
+    summary = metrics.summary()
+    return {
+        "format": report_type,
+        "file_type": file_type,
+        "rows": rows,
+        "agents": agents,
+        "workers": workers,
+        "backend": backend,
+        "profile": profile,
+        "stream": stream,
+        "pdfs": count,
+        "failures": len(errors),
+        "pdf_bytes": sum(len(pdf) for _, pdf in pdfs),
+        "bytes_per_pdf": round(sum(len(pdf) for _, pdf in pdfs) / len(pdfs)) if pdfs else None,
+        "zip_bytes": zip_bytes,
+        "seconds": {
+            "parse": round(parse_seconds, 4),
+            "render": round(render_seconds, 4),
+            "zip": round(zip_seconds, 4),
+            "total": round(total, 4),
+        },
+        "stages": summary["stages"],
+        "peak_rss_bytes": summary["peak_rss_bytes"],
+        "rows_per_second": round(rows / total, 1) if total else None,
+        "pdfs_per_second": round(count / total, 2) if total else None,
+    }
+
+
+def _case_id(case):
+    # Results saved before these options were rendered by WeasyPrint with the standard profile, loaded whole
+    backend, profile = case.get("backend", "weasyprint"), case.get("profile", "standard")
+    return (
+        case["format"], case["file_type"], case["rows"], case["agents"], case["workers"], backend, profile,
+        case.get("stream", False),
+    )
+
+
+def compare(results, baseline, tolerance):
+    """Cases whose best total time grew by more than `tolerance` (0.2 = 20%) against the baseline"""
+    previous = {_case_id(case): case for case in baseline["cases"]}
+    matched = [(case, previous[_case_id(case)]) for case in results["cases"] if _case_id(case) in previous]
+    if not matched:
+        print("No case in the baseline matches this run's settings")
+    regressions = []
+    for case, before in matched:
+        old, new = before["seconds"]["total"], case["seconds"]["total"]
+        change = (new - old) / old if old else 0.0
+        print(f"{case['format']:<12} {case['rows']:>8} rows  {old:8.2f}s -> {new:8.2f}s  ({change:+.1%})")
+        if change > tolerance:
+            regressions.append((case, change))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the report pipeline on synthetic data.")
+    parser.add_argument("--formats", nargs="+", choices=list(synthetic.GENERATORS), default=list(synthetic.GENERATORS))
+    parser.add_argument("--rows", nargs="+", type=int, default=[2000], help="input rows per case")
+    parser.add_argument("--agents", type=int, default=20, help="distinct agents per case")
+    parser.add_argument("--workers", type=int, default=1, help="render processes")
+    parser.add_argument("--file-type", choices=["xlsx", "csv"], default="xlsx",
+                        help="upload format for Performance/Generali (AXA is always xlsx)")
+    parser.add_argument("--backend", choices=PDF_BACKENDS, default=DEFAULT_PDF_BACKEND, help="PDF renderer")
+    parser.add_argument("--profile", choices=PDF_PROFILES, default=DEFAULT_PDF_PROFILE, help="output profile")
+    parser.add_argument("--stream", action="store_true",
+                        help="split CSV uploads into per-agent spill files (see cli.py --stream)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case; the fastest is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", type=Path, help="JSON file for the results (default: print only)")
+    parser.add_argument("--baseline", type=Path, help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs the baseline (0.2 = 20%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {"environment": environment(), "cases": []}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for report_type in args.formats:
+            for rows in args.rows:
+                runs = [
+                    run_case(
+                        report_type, rows, args.agents, args.workers, args.file_type, args.seed, workdir,
+                        args.backend, args.profile, args.stream,
+                    )
+                    for _ in range(max(1, args.repeat))
+                ]
+                best = min(runs, key=lambda run: run["seconds"]["total"])
+                results["cases"].append(best)
+                seconds = best["seconds"]
+                print(
+                    f"{report_type:<12} {rows:>8} rows {best['pdfs']:>5} PDFs  "
+                    f"parse {seconds['parse']:.2f}s  render {seconds['render']:.2f}s  "
+                    f"zip {seconds['zip']:.2f}s  total {seconds['total']:.2f}s  "
+                    f"{(best['bytes_per_pdf'] or 0) / 1024:.0f} KB/PDF"
+                )
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+        print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} case(s) slower than the baseline by more than {args.tolerance:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Headless batch generation, e.g. for scheduled runs:
+
+    python cli.py contratos.xlsx generali.csv -o out/ --date 2024-06-30 --workers 8
+
+With `--queue DIR` the layouts are rendered by worker.py processes watching DIR instead.
+
+Writes one PDF per agent into the output directory (a subfolder per input when several are
+given) and exits with status 1 if any file is unrecognized or any agent fails to render.
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import date
+from pathlib import Path
+
+from modules.ingest import load_upload, partition_csv, sniff_upload, streamable
+from modules.manifest import IncrementalOutput
+from modules.metrics import RunMetrics
+from modules.registry import detect_report, load_generator, rows_estimate, sniff_report
+from modules.settings import DEFAULT_PDF_BACKEND, DEFAULT_PDF_PROFILE, PDF_BACKENDS, PDF_PROFILES
+
+LOGO_FILE = Path(__file__).parent / "assets" / "atlas_logo.png"
+
+
+def run_file(path, out_dir, report_date, logo_url, metrics=None, incremental=False, stream=False, **render_options):
+    """
+    Generates every agent PDF for one input file into `out_dir`.
+    With `incremental`, agents unchanged since the manifest of the previous run in `out_dir`
+    keep their PDF, and PDFs of agents no longer in the input are deleted.
+    With `stream`, a Generali or Performance CSV is split into per-agent spill files and rendered
+    one agent at a time instead of being loaded whole.
+    Returns (report type, PDFs written, [(agent, message), ...] failures).
+    """
+    if metrics is None:
+        metrics = RunMetrics()
+    # Sheet names and headers first: unsupported files are rejected without a full parse
+    sheets = sniff_upload(path)
+    sniffed = sniff_report(sheets)
+    if sniffed is None:
+        return None, 0, [("-", "Format Not Recognized")]
+    rows = rows_estimate(sniffed, sheets)
+    print(f"{path}: {sniffed.label}, ~{rows if rows is not None else '?'} rows")
+    with metrics.stage("parse"):
+        if stream and streamable(path, sniffed.name):
+            data_source = partition_csv(path, sniffed.name, sniffed.agent_columns)
+        else:
+            data_source = load_upload(path, sniffed.name)
+    report, report_data = detect_report(data_source)
+    if report is None:
+        return None, 0, [("-", "Format Not Recognized")]
+
+    errors = []
+    out_dir.mkdir(parents=True, exist_ok=True)
+    output = IncrementalOutput(out_dir) if incremental else None
+    generate = load_generator(report)
+    written = 0
+    try:
+        results = generate(
+            report_data, logo_url, report_date, errors=errors, metrics=metrics, manifest=output, **render_options
+        )
+        for filename, pdf_bytes in results:
+            with metrics.stage("write"):
+                if output is not None:
+                    output.write(filename, pdf_bytes)
+                else:
+                    (out_dir / filename).write_bytes(pdf_bytes)
+            written += 1
+        if output is not None:
+            output.finish()
+    finally:
+        if output is not None:
+            output.close()
+
+    if output is not None:
+        summary = output.summary()
+        metrics.count("reused", summary["reused"])
+        metrics.count("removed", summary["removed"])
+        print(f"{path}: {summary['reused']} unchanged PDF(s) kept, {summary['removed']} removed")
+    return report.name, written, errors
+
+
+def output_folders(inputs):
+    """
+    Subfolder name per input path: its stem, plus its extension when another input shares the stem
+    (export.csv + export.xlsx) and a counter when that still clashes (a/export.csv + b/export.csv).
+    Names only depend on the inputs and their order, so --incremental runs find their folder again.
+    """
+    stems = [path.stem for path in inputs]
+    names = [
+        f"{path.stem}_{path.suffix.lstrip('.')}" if stems.count(path.stem) > 1 else path.stem for path in inputs
+    ]
+    folders, seen = [], {}
+    for name in names:
+        seen[name] = seen.get(name, 0) + 1
+        folders.append(f"{name}_{seen[name]}" if names.count(name) > 1 else name)
+    return folders
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate agent PDF reports without the Streamlit UI.")
+    parser.add_argument("inputs", nargs="+", type=Path, help="AXA workbook, Generali or Performance file(s)")
+    parser.add_argument("-o", "--output", type=Path, required=True, help="directory the PDFs are written to")
+    parser.add_argument("--date", type=date.fromisoformat, default=date.today(),
+                        help="report date, YYYY-MM-DD (default: today)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="render processes (default: all cores)")
+    parser.add_argument("--large-agent-rows", type=int, default=None,
+                        help="split agents above this many rows into chunks (0 disables)")
+    parser.add_argument("--backend", choices=PDF_BACKENDS, default=DEFAULT_PDF_BACKEND,
+                        help=f"PDF renderer (default: {DEFAULT_PDF_BACKEND}; reportlab is faster for large tables)")
+    parser.add_argument("--profile", choices=PDF_PROFILES, default=DEFAULT_PDF_PROFILE,
+                        help=f"output profile (default: {DEFAULT_PDF_PROFILE}; compact makes smaller PDFs for mailing)")
+    parser.add_argument("--queue", type=Path, default=None,
+                        help="render on the workers of this queue directory (see worker.py) instead of local processes")
+    parser.add_argument("--stream", action="store_true",
+                        help="read CSV inputs in chunks into per-agent spill files, for files too large to load whole")
+    parser.add_argument("--no-cache", action="store_true", help="don't read or write the rendered-PDF cache")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only re-render agents that changed since the last run into the same output directory")
+    parser.add_argument("--metrics", type=Path, help="write per-stage timings and memory (JSON) to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logo_url = LOGO_FILE.absolute().as_uri() if LOGO_FILE.exists() else ""
+    if not logo_url:
+        print(f"Warning: logo not found at {LOGO_FILE}", file=sys.stderr)
+
+    render_options = {"workers": max(1, args.workers), "backend": args.backend, "profile": args.profile}
+    if args.large_agent_rows is not None:
+        render_options["large_agent_rows"] = args.large_agent_rows
+    if not args.no_cache:
+        from modules.pdf_cache import PdfCache
+        render_options["cache"] = PdfCache()
+    if args.queue is not None:
+        from modules.task_queue import TaskQueue
+        render_options["queue"] = TaskQueue(args.queue)
+
+    failed = False
+    run_metrics = {}
+    for path, folder in zip(args.inputs, output_folders(args.inputs)):
+        # Several inputs may share agent names, so each gets its own folder
+        out_dir = args.output / folder if len(args.inputs) > 1 else args.output
+        metrics = RunMetrics()
+        try:
+            report_type, written, errors = run_file(
+                path, out_dir, args.date, logo_url, metrics, args.incremental, args.stream, **render_options
+            )
+        except Exception as e:
+            report_type, written, errors = None, 0, [("-", f"{type(e).__name__}: {e}")]
+        summary = run_metrics[str(path)] = metrics.summary()
+        for message in metrics.notes:
+            print(f"{path}: {message}", file=sys.stderr)
+
+        print(f"{path}: {report_type or 'not generated'}, {written} PDF(s) written to {out_dir}")
+        if summary["bytes_per_pdf"] is not None:
+            print(f"{path}: {summary['pdf_bytes'] / 1024 / 1024:.1f} MB, {summary['bytes_per_pdf'] / 1024:.0f} KB per PDF")
+        if errors:
+            failed = True
+            print(f"{path}: {len(errors)} failure(s)", file=sys.stderr)
+            for agent, message in errors:
+                print(f"  - {agent}: {message}", file=sys.stderr)
+
+    if args.metrics:
+        args.metrics.write_text(json.dumps(run_metrics, indent=2, ensure_ascii=False))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
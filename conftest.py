@@ -0,0 +1 @@
+# Puts the repository root on sys.path, so tests import `modules` like app.py and cli.py do
@@ -0,0 +1,58 @@
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+AGENTS_FILE = Path(__file__).parent.parent / "assets" / "agentes.csv"
+
+
+def normalize_codes(values):
+    """
+    Mediator codes as clean strings for a whole column: 758678.0 / '758678' / ' 758678 ' -> '758678'.
+    Same result as `str(int(float(code)))` per cell, falling back to the stripped text for non-numbers.
+    """
+    values = pd.Series(values)
+    numeric = pd.to_numeric(values, errors='coerce')
+    finite = np.isfinite(numeric.to_numpy(dtype=float, na_value=np.nan))
+    codes = values.map(str).str.strip()
+    codes[finite] = numeric[finite].astype('int64').map(str)
+    return codes
+
+
+class AgentDirectory:
+    """
+    agentes.csv as {normalized code: agent name}.
+    Parsed once and re-read only when the file's modification time changes.
+    """
+
+    def __init__(self, path=AGENTS_FILE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._names = {}
+
+    def names(self):
+        """{code: name}; empty if the file is missing. Raises if it exists but can't be parsed."""
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except OSError:
+            return {}
+        with self._lock:
+            if mtime != self._mtime:
+                mapping = pd.read_csv(self.path, dtype=str, encoding='utf-8-sig')
+                self._names = dict(zip(normalize_codes(mapping['code']), mapping['name']))
+                self._mtime = mtime
+            return self._names
+
+
+def unmapped_codes(codes, names):
+    """Sorted distinct normalized codes that have no entry in `names`"""
+    return sorted(set(pd.unique(codes)) - names.keys())
+
+
+@lru_cache(maxsize=None)
+def agent_directory():
+    """Shared directory for assets/agentes.csv"""
+    return AgentDirectory()
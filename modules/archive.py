@@ -0,0 +1,40 @@
+import contextlib
+import tempfile
+import zipfile
+
+# Archives below this size stay in memory; bigger ones roll over to a temp file on disk
+SPOOL_MAX_BYTES = 32 * 1024 * 1024
+
+
+def write_zip(files, compress=False, metrics=None):
+    """
+    Streams (filename, pdf_bytes) tuples into a spooled temporary ZIP.
+    Each PDF is written as soon as it arrives, so only one is held in memory at a time.
+    PDFs are already compressed internally, so they are STORED unless `compress` is set.
+    Returns (file object rewound to the start, number of files written).
+    Only the archive writes count towards the 'zip' stage of `metrics`, not producing the files.
+    A (filename, pdf_bytes, metrics) tuple times its write in its own metrics instead
+    (one archive over several files' batches, see jobs.MultiBatchJob).
+    """
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    archive = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, suffix=".zip")
+    count = 0
+    with zipfile.ZipFile(archive, "w", compression, False) as zip_file:
+        for filename, pdf_bytes, *entry_metrics in files:
+            stage_metrics = entry_metrics[0] if entry_metrics else metrics
+            with stage_metrics.stage('zip') if stage_metrics else contextlib.nullcontext():
+                zip_file.writestr(filename, pdf_bytes)
+            count += 1
+    archive.seek(0)
+    return archive, count
+
+
+def archive_reader(archive):
+    """
+    Zero-argument callable for st.download_button's deferred `data`:
+    the archive is only read back from disk when the user actually clicks.
+    """
+    def read():
+        archive.seek(0)
+        return archive.read()
+    return read
@@ -0,0 +1,73 @@
+import base64
+import io
+import mimetypes
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from PIL import Image
+
+# Logos are displayed at <= 140 CSS px; 600 px keeps them sharp in print at a fraction of the size
+MAX_IMAGE_WIDTH = 600
+
+
+def _optimize_image(data):
+    """Downscales and re-encodes a raster image without metadata, so every PDF embeds identical bytes"""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image_format = image.format
+            image.load()
+            if image.width > MAX_IMAGE_WIDTH:
+                height = round(image.height * MAX_IMAGE_WIDTH / image.width)
+                image = image.resize((MAX_IMAGE_WIDTH, height), Image.Resampling.LANCZOS)
+            out = io.BytesIO()
+            if image_format == "JPEG":
+                image.convert("RGB").save(out, format="JPEG", quality=90, optimize=True)
+            else:
+                image_format = "PNG"
+                image.save(out, format="PNG", optimize=True)
+    except Exception:
+        return data, None
+    return out.getvalue(), Image.MIME[image_format]
+
+
+@lru_cache(maxsize=None)
+def load_asset(url):
+    """
+    (bytes, mime type) for a local file:// asset, read and optimized once per process, or for a
+    base64 data: URI (see data_uri). Returns None for anything else, or a file that can't be read.
+    """
+    if (url or "").startswith("data:") and ";base64," in url:
+        mime_type, data = url[len("data:"):].split(";base64,", 1)
+        return base64.b64decode(data), mime_type
+    parsed = urlparse(url or "")
+    if parsed.scheme != "file":
+        return None
+    try:
+        data = Path(unquote(parsed.path)).read_bytes()
+    except OSError:
+        return None
+
+    mime_type = mimetypes.guess_type(parsed.path)[0] or "application/octet-stream"
+    if mime_type.startswith("image/") and mime_type != "image/svg+xml":
+        data, optimized_type = _optimize_image(data)
+        mime_type = optimized_type or mime_type
+    return data, mime_type
+
+
+def asset_bytes(url):
+    """Bytes actually embedded for `url` (empty if it can't be loaded), e.g. for cache keys"""
+    asset = load_asset(url)
+    return asset[0] if asset else b""
+
+
+def data_uri(url):
+    """
+    `url` as a data: URI if it is a loadable local asset, else unchanged: for HTML shown in a
+    browser, or documents rendered on another host
+    """
+    asset = load_asset(url)
+    if asset is None:
+        return url
+    data, mime_type = asset
+    return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+# --- COLUMN-WISE DISPLAY FORMATTING ---
+# Each helper turns a whole column into its final display strings in one pass, matching
+# what the per-cell Jinja filters produced, so templates only emit ready-made text.
+
+
+def column_or(df, name, default):
+    """df[name], or a constant column when the upload doesn't have it"""
+    return df[name] if name in df.columns else pd.Series(default, index=df.index, dtype=object)
+
+
+def dates(values, fmt):
+    """Parsed dates as `fmt` strings, NaT -> '-'. Anything that isn't a datetime column passes through."""
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    return values.dt.strftime(fmt).fillna("-")
+
+
+def money(values, symbol=""):
+    """utils.currency_format for a whole column: 1234.5 -> '1,234.50' (NaN -> 'nan')"""
+    return symbol + values.map("{:,.2f}".format)
+
+
+def money_or_dash(values, symbol="$"):
+    """`{% if v %}${{ v | currency }}{% else %}-{% endif %}`: zero becomes '-', NaN stays truthy"""
+    return pd.Series(np.where(values != 0, money(values, symbol), "-"), index=values.index)
+
+
+def sign_class(values, neutral=""):
+    """CSS class by sign: 'positive', 'negative' or `neutral`"""
+    return pd.Series(np.select([values > 0, values < 0], ["positive", "negative"], neutral), index=values.index)
+
+
+def signed_percent(values, neutral=""):
+    """
+    `(v | float * 100) | round(2)` with a '+' on gains: 0.12345 -> ('+12.35%', 'positive').
+    Returns (display strings, CSS classes).
+    """
+    pct = (values.astype(float) * 100).round(2)
+    text = np.where(pct > 0, "+", "") + pct.map(str) + "%"
+    return pd.Series(text, index=values.index), sign_class(pct, neutral)
+
+
+def euros(values):
+    """AXA `_fmt_eur` for a whole column: '€1,234.56', NaN -> '-'"""
+    return pd.Series(np.where(values.isna(), "-", money(values, "€")), index=values.index)
+
+
+def percent(values):
+    """AXA `_fmt_pct` for a whole column: 0.1234 -> '12.34%', NaN -> '-'"""
+    text = (values * 100).map("{:.2f}%".format)
+    return pd.Series(np.where(values.isna(), "-", text), index=values.index)
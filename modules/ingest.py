@@ -0,0 +1,303 @@
+import csv
+import os
+import pickle
+import tempfile
+import time
+from collections import namedtuple
+from importlib.util import find_spec
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+# Rust-based calamine parses .xlsx several times faster than openpyxl; use it when installed
+EXCEL_ENGINE = "calamine" if find_spec("python_calamine") else "openpyxl"
+
+# --- COLUMNS EACH REPORT ACTUALLY READS ---
+# Everything else in the upload is skipped at parse time.
+AXA_SHEETS = {
+    'Contratos': [
+        'Cod. Mediador', 'Asesor', 'Cartera', 'Producto', 'Estado', 'Situación plan de primas',
+        'Fecha de adquisición', 'Prima', 'Periodicidad prima', 'Inversión actual',
+        'Saldo actual', 'Rent. Desde inicio actual',
+    ],
+    'Clientes': ['Cartera', 'Cliente'],
+}
+GENERALI_COLUMNS = [
+    'agent', 'client', 'contract id', 'number of funds', 'date', 'income', 'net value', 'performance',
+]
+PERFORMANCE_COLUMNS = [
+    'Agent', 'Name', 'Account Number', 'Portfolio', 'Date', 'Net Deposit', 'Balance', 'Performance',
+]
+# Single-sheet formats by registry name, for loads where the format was already sniffed
+SINGLE_SHEET_COLUMNS = {'Generali': GENERALI_COLUMNS, 'Performance': PERFORMANCE_COLUMNS}
+# Codes read from CSVs as text (matched case-insensitively), so a column of mostly numeric agent
+# codes keeps one type throughout: whole-file and chunked reads (partition_csv) group alike
+TEXT_COLUMNS = {'agent'}
+# Labels repeated across many rows (matched case-insensitively), held as categoricals once loaded
+CATEGORY_COLUMNS = {
+    'agent', 'asesor', 'portfolio', 'cartera', 'producto', 'estado', 'situación plan de primas',
+    'periodicidad prima',
+}
+
+# Bytes read from the top of a CSV to take its header and estimate its row count
+SNIFF_BYTES = 64 * 1024
+
+# Rows per chunk when a CSV is streamed into per-agent spill files (see partition_csv)
+CSV_CHUNK_ROWS = 100_000
+
+# Header row and approximate data row count of one sheet (or of a CSV)
+SheetHeader = namedtuple('SheetHeader', ['columns', 'rows_estimate'])
+
+
+def _normalize(column):
+    return str(column).strip().lower()
+
+
+def _usecols(columns):
+    """Header filter for pandas' usecols, tolerant to case and stray whitespace"""
+    wanted = {_normalize(c) for c in columns}
+    return lambda column: _normalize(column) in wanted
+
+
+def _columns_for(header):
+    """Columns to keep for a single-sheet upload, picked from its header row"""
+    cols_lower = [_normalize(c) for c in header]
+    if 'contract id' in cols_lower:
+        return GENERALI_COLUMNS
+    if 'account number' in cols_lower:
+        return PERFORMANCE_COLUMNS
+    return None
+
+
+def _text_dtypes(header):
+    """read_csv dtype for the TEXT_COLUMNS of a header"""
+    return {column: str for column in header if _normalize(column) in TEXT_COLUMNS}
+
+
+def _is_csv(uploaded_file):
+    return getattr(uploaded_file, 'name', str(uploaded_file)).lower().endswith('.csv')
+
+
+def _rewind(uploaded_file):
+    if hasattr(uploaded_file, 'seek'):
+        uploaded_file.seek(0)
+
+
+def _sniff_csv(uploaded_file):
+    if hasattr(uploaded_file, 'read'):
+        head = uploaded_file.read(SNIFF_BYTES)
+        size = uploaded_file.seek(0, os.SEEK_END)
+        _rewind(uploaded_file)
+    else:
+        with open(uploaded_file, 'rb') as f:
+            head = f.read(SNIFF_BYTES)
+        size = os.path.getsize(uploaded_file)
+
+    lines = head.splitlines()
+    if not lines:
+        return SheetHeader([], 0)
+    columns = next(csv.reader([lines[0].decode('utf-8-sig', errors='replace')]), [])
+    if len(head) >= size:
+        return SheetHeader(columns, len(lines) - 1)
+    # Extrapolate from the sample's complete lines (the last one is usually cut off)
+    complete_lines = head.count(b'\n')
+    if not complete_lines:
+        return SheetHeader(columns, None)
+    bytes_per_line = (head.rfind(b'\n') + 1) / complete_lines
+    return SheetHeader(columns, round(size / bytes_per_line) - 1)
+
+
+def _sniff_workbook(uploaded_file):
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        sheets = {}
+        for sheet in workbook.worksheets:
+            first_row = next(sheet.iter_rows(max_row=1, values_only=True), ())
+            columns = [c for c in first_row if c is not None]
+            # max_row comes from the sheet's <dimension> tag, not from scanning the rows
+            rows = sheet.max_row - 1 if sheet.max_row else None
+            sheets[sheet.title] = SheetHeader(columns, rows)
+        return sheets
+    finally:
+        workbook.close()
+        _rewind(uploaded_file)
+
+
+def sniff_upload(uploaded_file):
+    """
+    {sheet name: SheetHeader} from the sheet names and header rows only; no data row is parsed.
+    Workbooks are opened read-only; a CSV comes back as a single sheet named after the file.
+    """
+    if _is_csv(uploaded_file):
+        name = Path(getattr(uploaded_file, 'name', str(uploaded_file))).stem
+        return {name: _sniff_csv(uploaded_file)}
+    return _sniff_workbook(uploaded_file)
+
+
+def compact_dtypes(df):
+    """
+    Shrinks a freshly parsed sheet in place and returns it: CATEGORY_COLUMNS text becomes
+    categorical, whole-number columns take the smallest integer type. Floats stay float64,
+    so amounts and their sums are unchanged.
+    """
+    for column in df.columns:
+        values = df[column]
+        if _normalize(column) in CATEGORY_COLUMNS and not pd.api.types.is_numeric_dtype(values):
+            df[column] = values.astype('category')
+        elif pd.api.types.is_integer_dtype(values):
+            df[column] = pd.to_numeric(values, downcast='integer')
+    return df
+
+
+def load_upload(uploaded_file, report_name=None):
+    """
+    Parses only what the detected report needs. Accepts an uploaded file object or a path.
+    `report_name` is the sniffed registry format; without it the format is picked from the header.
+    - AXA workbooks: dict with the 'Contratos' and 'Clientes' sheets, trimmed to the used columns
+    - Generali / Performance: DataFrame of the first sheet (or CSV), trimmed to the used columns
+    - Anything else: the first sheet as-is, so the caller can report it as unrecognized
+    Recognized sheets come back with compact dtypes (see compact_dtypes); CSV agent codes are read as text.
+    """
+    if _is_csv(uploaded_file):
+        header = pd.read_csv(uploaded_file, nrows=0).columns
+        _rewind(uploaded_file)
+        columns = _columns_for(header) if report_name is None else SINGLE_SHEET_COLUMNS.get(report_name)
+        if not columns:
+            return pd.read_csv(uploaded_file)
+        df = pd.read_csv(uploaded_file, usecols=_usecols(columns), dtype=_text_dtypes(header))
+        return compact_dtypes(df)
+
+    with pd.ExcelFile(uploaded_file, engine=EXCEL_ENGINE) as workbook:
+        if report_name == 'AXA' or (
+            report_name is None and all(sheet in workbook.sheet_names for sheet in AXA_SHEETS)
+        ):
+            return {
+                sheet: compact_dtypes(workbook.parse(sheet, usecols=_usecols(columns)))
+                for sheet, columns in AXA_SHEETS.items()
+            }
+
+        if report_name is None:
+            header = workbook.parse(0, nrows=0).columns
+            columns = _columns_for(header)
+        else:
+            columns = SINGLE_SHEET_COLUMNS.get(report_name)
+        df = workbook.parse(0, usecols=_usecols(columns) if columns else None)
+        return compact_dtypes(df) if columns else df
+
+
+def streamable(uploaded_file, report_name):
+    """Whether an upload of the sniffed `report_name` can be streamed with partition_csv"""
+    return _is_csv(uploaded_file) and report_name in SINGLE_SHEET_COLUMNS
+
+
+class AgentPartitions:
+    """
+    A CSV upload split by agent into spill files on disk (see partition_csv), standing in for
+    its DataFrame: generators read and clean one agent's rows at a time, so peak memory follows
+    the largest agent rather than the whole file. The files are removed with the object.
+
+    `header` is a zero-row frame of the kept columns. Renaming its columns (as format detection
+    does) renames them in every partition read afterwards. `counts` holds rows per agent, in
+    agent order.
+    """
+
+    def __init__(self, header, agent_position, counts, files, directory):
+        self.header = header
+        self.counts = counts
+        self._agent_position = agent_position
+        self._files = files
+        self._tmp = directory
+
+    @property
+    def agent_column(self):
+        return self.header.columns[self._agent_position]
+
+    @property
+    def rows(self):
+        return int(self.counts.sum())
+
+    def read(self, agent):
+        """One agent's rows, with their original row numbers as index and compact dtypes"""
+        pieces = []
+        with open(self._files[agent], 'rb') as f:
+            while True:
+                try:
+                    pieces.append(pickle.load(f))
+                except EOFError:
+                    break
+        index = np.concatenate([piece_index for piece_index, _ in pieces])
+        columns = {
+            name: np.concatenate([piece_columns[i] for _, piece_columns in pieces])
+            for i, name in enumerate(self.header.columns)
+        }
+        return compact_dtypes(pd.DataFrame(columns, index=index))
+
+    def tables(self, prepare, agents=None, metrics=None):
+        """
+        (agent, prepare(rows)) per agent in agent order, read one at a time; with `agents`,
+        only those. Read and `prepare` times go to the 'spill' and 'clean' stages of `metrics`.
+        """
+        for agent in self.counts.index:
+            if agents is not None and agent not in agents:
+                continue
+            start = time.perf_counter()
+            rows = self.read(agent)
+            read_seconds = time.perf_counter() - start
+            table = prepare(rows)
+            if metrics is not None:
+                metrics.add('spill', read_seconds)
+                metrics.add('clean', time.perf_counter() - start - read_seconds)
+            yield agent, table
+
+    def close(self):
+        self._tmp.cleanup()
+
+
+def partition_csv(uploaded_file, report_name, agent_columns, chunk_rows=CSV_CHUNK_ROWS, directory=None):
+    """
+    Streams a Generali or Performance CSV into an AgentPartitions, `chunk_rows` rows at a time.
+    Only the report's columns are kept. Each chunk's rows are appended to one spill file per
+    value of the agent column: the first of `agent_columns` present, matched case-insensitively.
+    Spill files go to a temporary folder of `directory` (default: the system temp directory).
+    """
+    columns = SINGLE_SHEET_COLUMNS[report_name]
+    header = pd.read_csv(uploaded_file, nrows=0, usecols=_usecols(columns))
+    _rewind(uploaded_file)
+    present = [_normalize(c) for c in header.columns]
+    agent_position = next((present.index(c.lower()) for c in agent_columns if c.lower() in present), None)
+    if agent_position is None:
+        raise ValueError(f"No agent column ({', '.join(agent_columns)}) to split the upload by.")
+    agent_column = header.columns[agent_position]
+    # Agent codes as text: each chunk infers its own dtypes, so numeric codes in one chunk and
+    # text codes in a later one would otherwise split an agent into an int and a str partition
+    dtype = {**_text_dtypes(header.columns), agent_column: str}
+
+    tmp = tempfile.TemporaryDirectory(prefix="atlas_spill_", dir=directory)
+    files, counts = {}, {}
+    try:
+        for chunk in pd.read_csv(uploaded_file, usecols=_usecols(columns), dtype=dtype, chunksize=chunk_rows):
+            # Rows sorted by agent once per chunk, then spilled as plain column slices: pickling
+            # arrays costs a fraction of pickling one small DataFrame per agent and chunk
+            codes, agents = pd.factorize(chunk[agent_column])
+            order = np.argsort(codes, kind='stable')
+            sorted_codes = codes[order]
+            starts = np.searchsorted(sorted_codes, np.arange(len(agents)), side='left')
+            ends = np.searchsorted(sorted_codes, np.arange(len(agents)), side='right')
+            index = chunk.index.to_numpy()[order]
+            values = [chunk[column].to_numpy()[order] for column in chunk.columns]
+            for agent, start, end in zip(agents, starts, ends):
+                if agent not in files:
+                    files[agent] = os.path.join(tmp.name, f"{len(files)}.pkl")
+                    counts[agent] = 0
+                with open(files[agent], 'ab') as f:
+                    pickle.dump((index[start:end], [column[start:end] for column in values]), f, pickle.HIGHEST_PROTOCOL)
+                counts[agent] += int(end - start)
+    except BaseException:
+        tmp.cleanup()
+        raise
+    finally:
+        _rewind(uploaded_file)
+    # Same agent order as a groupby over the whole file
+    return AgentPartitions(header, agent_position, pd.Series(counts, dtype='int64').sort_index(), files, tmp)
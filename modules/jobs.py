@@ -0,0 +1,269 @@
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from .archive import write_zip
+
+
+class BatchJob:
+    """
+    Consumes a generate_*_pdfs generator on a background thread so the UI stays responsive.
+    Each PDF is written to disk as it arrives, so progress, a ZIP of the PDFs finished so far
+    and cancellation are available while the batch runs. The app keeps the job in
+    st.session_state, where it survives reruns.
+
+    `metrics` and `errors` must be the ones the generator was created with. With an
+    IncrementalOutput as `output`, PDFs go to its directory and the manifest is only
+    saved if the batch completes; otherwise they go to a temporary directory that is
+    removed together with the job object. With `archive` False no ZIP is written (a
+    MultiBatchJob archives its files together, then closes the job).
+    """
+
+    def __init__(self, pdfs, metrics, errors, output=None, compress=False, archive=True):
+        self._pdfs = pdfs
+        self.metrics = metrics
+        self.errors = errors
+        self.output = output
+        self.compress = compress
+        self.archive = archive
+        self._tmp = None if output else tempfile.TemporaryDirectory(prefix="atlas_batch_")
+        self.directory = output.directory if output else Path(self._tmp.name)
+
+        self.files = []
+        self.status = "pending"
+        self.error = None
+        self.zip = None
+        self.count = 0
+        self.summary = None
+        self._finished_output = False
+        self.started = self.ended = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="atlas-batch", daemon=True)
+
+    @property
+    def running(self):
+        return self.status in ("pending", "running")
+
+    @property
+    def cancelling(self):
+        return self._cancel.is_set() and self.running
+
+    def start(self):
+        self.started = time.monotonic()
+        self.status = "running"
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Stops after the PDF currently being produced; what finished so far is kept"""
+        self._cancel.set()
+
+    def _run(self):
+        try:
+            for filename, pdf_bytes in self._pdfs:
+                if self.output is not None:
+                    self.output.write(filename, pdf_bytes)
+                else:
+                    (self.directory / filename).write_bytes(pdf_bytes)
+                with self._lock:
+                    self.files.append(filename)
+                if self._cancel.is_set():
+                    break
+            self._pdfs.close()  # shuts the render pool down, dropping queued agents if cancelled
+
+            cancelled = self._cancel.is_set()
+            if self.output is not None and not cancelled:
+                self.output.finish()
+                self._finished_output = True
+            if self.archive:
+                self.zip, self.count = write_zip(self.results(), compress=self.compress, metrics=self.metrics)
+            else:
+                self.count = len(self.files)
+            self.summary = self.metrics.summary()
+            self.status = "cancelled" if cancelled else "done"
+        except Exception as e:
+            self._pdfs.close()
+            self.error = e
+            self.status = "failed"
+        finally:
+            if self.archive:
+                self.close()
+            self.ended = time.monotonic()
+
+    def close(self):
+        """Releases the incremental output directory (see IncrementalOutput.close) once its ZIP is written"""
+        if self.output is not None:
+            self.output.close()
+
+    def _read(self, filenames):
+        for filename in filenames:
+            yield filename, (self.directory / filename).read_bytes()
+
+    def wait(self):
+        self._thread.join()
+
+    def results(self):
+        """
+        (filename, pdf_bytes) of the finished batch, read back one at a time: every PDF of a
+        completed incremental run, otherwise the ones this job produced
+        """
+        if self._finished_output:
+            return self.output.files()
+        return self._read(list(self.files))
+
+    def progress(self):
+        """(agents finished, total agents or None until known, seconds remaining or None)"""
+        total = self.metrics.counts.get('agents')
+        done = self.metrics.finished
+        elapsed = (self.ended or time.monotonic()) - self.started
+        remaining = elapsed / done * (total - done) if total and done else None
+        return done, total, remaining
+
+    def finished(self):
+        """(filename, pdf_bytes) of the PDFs finished so far, read back one at a time"""
+        with self._lock:
+            filenames = list(self.files)
+        return self._read(filenames)
+
+    def partial_zip(self):
+        """ZIP bytes of the PDFs finished so far (for st.download_button while the batch runs)"""
+        archive, _ = write_zip(self.finished())
+        with archive:
+            return archive.read()
+
+
+# One uploaded file of a MultiBatchJob: `label` names it in the status summary, `folder` is
+# where its PDFs go inside the ZIP ('' for the top level)
+BatchFile = namedtuple('BatchFile', ['label', 'report_type', 'folder', 'job'])
+
+
+def share_workers(workers, count):
+    """Splits `workers` render processes between `count` batches running side by side (at least 1 each)"""
+    base, extra = divmod(workers, count)
+    return [max(1, base + (i < extra)) for i in range(count)]
+
+
+class MultiBatchJob:
+    """
+    Several BatchJobs (one per uploaded file, created with archive=False) running side by side,
+    so one file's data preparation and layout overlap with the others'. Their PDFs go into one
+    ZIP with a folder per file. A file that fails is reported in results() without stopping the rest.
+    Offers the same progress, cancel and partial_zip interface as a single BatchJob.
+    """
+
+    def __init__(self, files, compress=False):
+        self.batch_files = files
+        self.compress = compress
+
+        self.status = "pending"
+        self.error = None
+        self.zip = None
+        self.count = 0
+        self.started = self.ended = None
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="atlas-multi-batch", daemon=True)
+
+    @property
+    def running(self):
+        return self.status in ("pending", "running")
+
+    @property
+    def cancelling(self):
+        return self._cancel.is_set() and self.running
+
+    @property
+    def files(self):
+        """ZIP paths of the PDFs finished so far"""
+        return [
+            _in_folder(batch_file.folder, filename)
+            for batch_file in self.batch_files for filename in list(batch_file.job.files)
+        ]
+
+    def start(self):
+        self.started = time.monotonic()
+        self.status = "running"
+        for batch_file in self.batch_files:
+            batch_file.job.start()
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+        for batch_file in self.batch_files:
+            batch_file.job.cancel()
+
+    def _run(self):
+        try:
+            for batch_file in self.batch_files:
+                batch_file.job.wait()
+            jobs = [batch_file.job for batch_file in self.batch_files]
+            self.zip, self.count = write_zip(self._results(), compress=self.compress)
+            for job in jobs:
+                if job.summary is not None:
+                    job.summary = job.metrics.summary()  # now with its 'zip' stage
+            if all(job.status == "failed" for job in jobs):
+                self.error = jobs[0].error
+                self.status = "failed"
+            else:
+                self.status = "cancelled" if self._cancel.is_set() else "done"
+        except Exception as e:
+            self.error = e
+            self.status = "failed"
+        finally:
+            for batch_file in self.batch_files:
+                batch_file.job.close()
+            self.ended = time.monotonic()
+
+    def _results(self):
+        for batch_file in self.batch_files:
+            if batch_file.job.status != "failed":
+                # Each file's archive writes are timed in its own metrics, next to its other stages
+                for filename, pdf_bytes in batch_file.job.results():
+                    yield _in_folder(batch_file.folder, filename), pdf_bytes, batch_file.job.metrics
+
+    def progress(self):
+        """(agents finished, total agents or None until every file knows its total, seconds remaining or None)"""
+        jobs = [batch_file.job for batch_file in self.batch_files]
+        done = sum(job.metrics.finished for job in jobs)
+        totals = [job.metrics.counts.get('agents') for job in jobs]
+        total = None if None in totals else sum(totals)
+        elapsed = (self.ended or time.monotonic()) - self.started
+        remaining = elapsed / done * (total - done) if total and done else None
+        return done, total, remaining
+
+    def partial_zip(self):
+        """ZIP bytes of the PDFs finished so far, across all files"""
+        finished = (
+            (_in_folder(batch_file.folder, filename), pdf_bytes)
+            for batch_file in self.batch_files for filename, pdf_bytes in batch_file.job.finished()
+        )
+        archive, _ = write_zip(finished)
+        with archive:
+            return archive.read()
+
+    def results(self):
+        """Per-file status summary: one dict per uploaded file, in upload order"""
+        return [
+            {
+                "file": batch_file.label,
+                "report_type": batch_file.report_type,
+                "folder": batch_file.folder,
+                "status": batch_file.job.status,
+                "pdfs": batch_file.job.count,
+                "errors": list(batch_file.job.errors),
+                "error": str(batch_file.job.error) if batch_file.job.error else None,
+                "incremental": (
+                    batch_file.job.output.summary()
+                    if batch_file.job.output and batch_file.job.status == "done" else None
+                ),
+                "metrics": batch_file.job.summary,
+            }
+            for batch_file in self.batch_files
+        ]
+
+
+def _in_folder(folder, filename):
+    return f"{folder}/{filename}" if folder else filename
@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: runs are only kept apart within one process
+    fcntl = None
+
+from .pdf_cache import default_cache_dir
+
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".lock"
+
+# Directories opened by an IncrementalOutput of this process (app sessions share one process)
+_IN_USE = set()
+_IN_USE_LOCK = threading.Lock()
+
+
+def default_output_dir(report_name):
+    """Where the app keeps the last incremental run of each report type"""
+    return default_cache_dir() / "runs" / report_name
+
+
+def _write_atomic(path, data):
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def _file_stat(path):
+    """[size, mtime_ns] of a file (None if missing): any rewrite of the file changes it"""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class OutputBusy(RuntimeError):
+    """Another incremental run is writing to the same output directory"""
+
+
+class IncrementalOutput:
+    """
+    A directory of agent PDFs plus a manifest of the run that produced them:
+    agent -> {"hash": RenderJob.cache_key, "file": filename, "stat": [size, mtime_ns]}. The hash
+    covers the agent's rows and everything else printed on the PDF (template, logo, report date);
+    the stat identifies the file written for it.
+
+    render_pdfs skips jobs whose hash and filename match the manifest while the file is still
+    there unchanged, and records every other successful job. The caller writes the new PDFs with write()
+    and then calls finish(), which deletes PDFs of departed (or failed) agents and saves the new manifest.
+
+    The directory is held exclusively from creation until close() (also a context manager):
+    a second IncrementalOutput on it, from this process or another, raises OutputBusy
+    instead of deleting files under the first run's feet.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock_file = None
+        self._held = False
+        self._acquire()
+        self.previous = self._load()
+        self.entries = {}
+        # filename -> _file_stat of the PDFs this run wrote, saved with their entries
+        self._stats = {}
+        self.written = 0
+        self.reused = 0
+        self.removed = 0
+
+    def _acquire(self):
+        key = self.directory.resolve()
+        with _IN_USE_LOCK:
+            if key in _IN_USE:
+                raise OutputBusy(f"Another incremental run is using {self.directory}")
+            _IN_USE.add(key)
+        self._held = True
+        if fcntl is None:
+            return
+        self._lock_file = open(self.directory / LOCK_FILE, "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.close()
+            raise OutputBusy(f"Another process has an incremental run in {self.directory}") from None
+
+    def close(self):
+        """Releases the directory for the next run; safe to call more than once"""
+        if self._lock_file is not None:
+            self._lock_file.close()  # drops the flock
+            self._lock_file = None
+        if self._held:
+            with _IN_USE_LOCK:
+                _IN_USE.discard(self.directory.resolve())
+            self._held = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def _load(self):
+        try:
+            manifest = json.loads((self.directory / MANIFEST_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return manifest.get("agents", {})
+
+    def unchanged(self, job):
+        """True (and the previous PDF is kept) if the job would produce the same file as last run"""
+        previous = self.previous.get(str(job.agent))
+        if not job.cache_key or previous is None:
+            return False
+        if previous["hash"] != job.cache_key or previous["file"] != job.filename:
+            return False
+        # The file must still be the one the manifest was saved with: a later run that was
+        # cancelled or failed may have overwritten it without saving its own manifest
+        if previous.get("stat") != _file_stat(self.directory / job.filename):
+            return False
+        self.entries[str(job.agent)] = previous
+        self.reused += 1
+        return True
+
+    def record(self, job):
+        self.entries[str(job.agent)] = {"hash": job.cache_key, "file": job.filename}
+
+    def write(self, filename, pdf_bytes):
+        _write_atomic(self.directory / filename, pdf_bytes)
+        self._stats[filename] = _file_stat(self.directory / filename)
+        self.written += 1
+
+    def finish(self):
+        for entry in self.entries.values():
+            if entry["file"] in self._stats:
+                entry["stat"] = self._stats[entry["file"]]
+        keep = {entry["file"] for entry in self.entries.values()}
+        for entry in self.previous.values():
+            if entry["file"] not in keep:
+                (self.directory / entry["file"]).unlink(missing_ok=True)
+                self.removed += 1
+        manifest = {"agents": self.entries}
+        _write_atomic(self.directory / MANIFEST_FILE, json.dumps(manifest, indent=2, ensure_ascii=False).encode())
+
+    def files(self):
+        """(filename, pdf_bytes) for every PDF of this run, read back one at a time (e.g. for write_zip)"""
+        for entry in self.entries.values():
+            yield entry["file"], (self.directory / entry["file"]).read_bytes()
+
+    def summary(self):
+        return {"written": self.written, "reused": self.reused, "removed": self.removed}
@@ -0,0 +1,104 @@
+import json
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Display order of the pipeline stages (any other recorded stage is listed after these)
+STAGES = ['parse', 'spill', 'clean', 'groupby', 'jinja', 'weasyprint', 'prepare', 'reportlab', 'zip']
+
+
+def peak_rss_bytes():
+    """
+    Peak resident memory of this process and of its finished child processes (the render
+    pool), as {'process': bytes, 'children': bytes}. None where the platform can't tell.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "process": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+class RunMetrics:
+    """
+    Timings and counters for one batch, filled in by the generators, render_pdfs and write_zip.
+    Stage times are summed wall-clock seconds; the PDF stage ('weasyprint' or 'reportlab') is measured
+    inside each render, so with a process pool it adds up work done in parallel and can exceed the
+    batch's wall time.
+    """
+
+    def __init__(self):
+        self.stages = defaultdict(float)
+        self.counts = {}
+        self.agents = {}
+        self.finished = 0
+        self.notes = []
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - start
+
+    def add(self, name, seconds):
+        self.stages[name] += seconds
+
+    def count(self, name, value):
+        self.counts[name] = value
+
+    def agent(self, agent, seconds, rows=None, cached=False):
+        """Adds `seconds` of work to one agent's total (template render, layout, cache read)"""
+        entry = self.agents.setdefault(str(agent), {"seconds": 0.0, "rows": None, "cached": False, "bytes": None})
+        entry["seconds"] += seconds
+        if rows is not None:
+            entry["rows"] = rows
+        entry["cached"] = entry["cached"] or cached
+
+    def agent_output(self, agent, size):
+        """Size in bytes of the PDF produced (or reused from the cache) for one agent"""
+        self.agent(agent, 0.0)
+        self.agents[str(agent)]["bytes"] = size
+
+    def agent_finished(self):
+        """One more agent done (rendered, reused or failed), for progress reporting"""
+        self.finished += 1
+
+    def note(self, message):
+        self.notes.append(message)
+
+    def summary(self):
+        order = STAGES + sorted(set(self.stages) - set(STAGES))
+        agents = sorted(
+            ({"agent": name, **entry} for name, entry in self.agents.items()),
+            key=lambda entry: entry["seconds"], reverse=True,
+        )
+        for entry in agents:
+            entry["seconds"] = round(entry["seconds"], 4)
+        sizes = [entry["bytes"] for entry in agents if entry["bytes"] is not None]
+        return {
+            "wall_seconds": round(time.perf_counter() - self._started, 4),
+            "stages": {name: round(self.stages[name], 4) for name in order if name in self.stages},
+            "counts": dict(self.counts),
+            "agents": agents,
+            "finished_agents": self.finished,
+            "cached_agents": sum(entry["cached"] for entry in agents),
+            "pdf_bytes": sum(sizes),
+            "bytes_per_pdf": round(sum(sizes) / len(sizes)) if sizes else None,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "notes": list(self.notes),
+        }
+
+    def to_json(self):
+        return json.dumps(self.summary(), indent=2, ensure_ascii=False)
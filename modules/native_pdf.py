@@ -0,0 +1,297 @@
+import io
+from collections import namedtuple
+from functools import lru_cache
+from pathlib import Path
+
+try:
+    from reportlab import Version as REPORTLAB_VERSION
+    from reportlab.lib.colors import HexColor
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.units import cm
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.pdfgen.canvas import Canvas
+except ImportError:  # optional: pip install "reportlab[accel]"
+    REPORTLAB_VERSION = None
+
+from PIL import Image
+
+from .assets import load_asset
+from .pdf_cache import make_key
+
+# --- REPORT LAYOUT ---
+# The 'reportlab' backend draws every report as the same fixed layout the templates produce:
+# a header (logo, title, agent, date line, KPI cards) above fixed-column tables whose header
+# row repeats on every page. Report modules describe one agent as a Report of plain values
+# (picklable, for the render pool). Sizes are CSS px, as in the stylesheets; 1px = 0.75pt.
+
+# One table column. `field` indexes the row tuples; `width` is relative to the other columns.
+# `bold` mirrors a <strong> cell, `blank` replaces falsy values (`{{ v or '-' }}`) and
+# `class_field` indexes the row's CSS class for this cell ('positive', 'negative', 'neutral').
+Column = namedtuple('Column', ['title', 'field', 'width', 'align', 'header_align', 'bold', 'blank', 'class_field'],
+                    defaults=(None, False, None, None))
+# `rows` are tuples like the template loops unpack; rows whose `highlight_field` is truthy are
+# drawn like `tr.paralizado`. A `title` draws a section title above the table.
+DataTable = namedtuple('DataTable', ['title', 'columns', 'rows', 'highlight_field'], defaults=(None,))
+Card = namedtuple('Card', ['label', 'value', 'alert'], defaults=(False,))
+Style = namedtuple('Style', [
+    'font_size', 'header_size', 'padding', 'logo_width', 'title_size', 'agent_size', 'date_size',
+    'card_width', 'card_gap', 'card_label_size', 'card_value_size', 'table_gap',
+], defaults=(9.5, 8.5, (10, 5), 140, 13, 16, 9, 190, 10, 8, 14, 0))
+Report = namedtuple('Report', ['logo_url', 'title', 'agent', 'subtitle', 'cards', 'tables', 'style'])
+
+# Feeds the PDF cache key of reportlab-rendered agents: editing this module invalidates old entries
+VERSION = make_key(Path(__file__).read_bytes(), REPORTLAB_VERSION)
+
+PAGE_MARGIN = 0.8  # cm
+ACCENT = '#232ECF'
+HIGHLIGHT_BACKGROUND, HIGHLIGHT_TEXT = '#fff4e5', '#cc5500'
+CLASS_STYLES = {  # color, bold
+    'positive': ('#008000', True),
+    'negative': ('#cc0000', True),
+    'neutral': ('#888888', False),
+}
+FONT, BOLD_FONT = 'Helvetica', 'Helvetica-Bold'
+LINE_HEIGHT = 1.2
+BASELINE = 0.86  # distance from the top of a line box to the baseline, in font sizes (Helvetica)
+
+
+def layout_version(report_module_file):
+    """Cache-key part for reportlab PDFs: this module plus the report module that describes the layout"""
+    return make_key(VERSION, Path(report_module_file).read_bytes())
+
+
+def px(value):
+    return value * 0.75
+
+
+@lru_cache(maxsize=None)
+def _color(hex_code):
+    return HexColor(hex_code)
+
+
+@lru_cache(maxsize=None)
+def _logo(url, max_width=None):
+    """
+    (ImageReader, width px, height px) of a local logo, read once per process; None if missing.
+    With `max_width`, wider images are resampled to that many pixels (the size stays the original's).
+    """
+    asset = load_asset(url)
+    if asset is None:
+        return None
+    image = Image.open(io.BytesIO(asset[0]))
+    width, height = image.size
+    if max_width and width > max_width:
+        image = image.resize((max_width, max(1, round(height * max_width / width))), Image.Resampling.LANCZOS)
+    return ImageReader(image), width, height
+
+
+def _fit(text, font, size, width):
+    """`text-overflow: ellipsis` for one cell: (text cut to `width` points with a trailing '…', its width)"""
+    text_width = stringWidth(text, font, size)
+    if text_width <= width:
+        return text, text_width
+    while text and stringWidth(text + '…', font, size) > width:
+        text = text[:-1]
+    return text + '…', stringWidth(text + '…', font, size)
+
+
+class _Page:
+    """The canvas plus a cursor moving down from the top margin"""
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        width, self.height = canvas._pagesize
+        self.margin = PAGE_MARGIN * cm
+        self.left, self.right = self.margin, width - self.margin
+        self.y = self.height - self.margin
+
+    def fits(self, height):
+        return self.y - height >= self.margin
+
+    def new_page(self):
+        self.canvas.showPage()
+        self.y = self.height - self.margin
+
+    def text(self, text, x, top, font, size, color, align='left'):
+        """One line of text whose line box starts at `top`; `x` is its left, right or center edge"""
+        canvas = self.canvas
+        canvas.setFont(font, size)
+        canvas.setFillColor(_color(color))
+        baseline = top - size * BASELINE
+        if align == 'right':
+            canvas.drawRightString(x, baseline, text)
+        elif align == 'center':
+            canvas.drawCentredString(x, baseline, text)
+        else:
+            canvas.drawString(x, baseline, text)
+
+    def rule(self, y, width, color):
+        self.canvas.setStrokeColor(_color(color))
+        self.canvas.setLineWidth(width)
+        self.canvas.line(self.left, y, self.right, y)
+
+    def band(self, top, height, color):
+        self.canvas.setFillColor(_color(color))
+        self.canvas.rect(self.left, top - height, self.right - self.left, height, stroke=0, fill=1)
+
+
+def _draw_header(page, report, image_dpi=None):
+    """Logo and title on the left, agent, date line and KPI cards on the right, over the accent line"""
+    style = report.style
+    agent_size, date_size, title_size = px(style.agent_size), px(style.date_size), px(style.title_size)
+    label_size, value_size = px(style.card_label_size), px(style.card_value_size)
+
+    logo = _logo(report.logo_url)
+    logo_w = logo_h = 0
+    if logo is not None:
+        shown = min(logo[1], style.logo_width)
+        logo_w, logo_h = px(shown), px(shown * logo[2] / logo[1])
+        if image_dpi:
+            logo = _logo(report.logo_url, round(logo_w / 72 * image_dpi))
+    left_h = logo_h + (px(5) + title_size * LINE_HEIGHT if report.title else 0)
+
+    card_h = px(6 + 1 + 6) + (label_size + value_size) * LINE_HEIGHT
+    right_h = (agent_size + date_size) * LINE_HEIGHT + px(2) + (px(8) + card_h if report.cards else 0)
+
+    # Both sides sit on the header's bottom edge (align-items: flex-end)
+    bottom = page.y - max(left_h, right_h)
+    top = bottom + left_h
+    if logo is not None:
+        page.canvas.drawImage(logo[0], page.left, top - logo_h, logo_w, logo_h, mask='auto')
+    if report.title:
+        page.text(report.title.upper(), page.left, top - logo_h - px(5), BOLD_FONT, title_size, '#000000')
+
+    top = bottom + right_h
+    page.text(str(report.agent), page.right, top, BOLD_FONT, agent_size, '#000000', 'right')
+    top -= agent_size * LINE_HEIGHT + px(2)
+    page.text(str(report.subtitle), page.right, top, FONT, date_size, '#666666', 'right')
+
+    x = page.right
+    for card in reversed(report.cards or ()):
+        label, value = card.label.upper(), str(card.value)
+        content = max(stringWidth(label, FONT, label_size), stringWidth(value, BOLD_FONT, value_size))
+        width = max(px(style.card_width), content + px(2 * 12))
+        x -= width
+        border, background, value_color = (
+            ('#cc0000', '#fff5f5', '#cc0000') if card.alert else ('#e0e0e0', '#ffffff', '#000000')
+        )
+        page.canvas.setStrokeColor(_color(border))
+        page.canvas.setFillColor(_color(background))
+        page.canvas.setLineWidth(px(1))
+        page.canvas.roundRect(x, bottom, width, card_h, px(6), stroke=1, fill=1)
+        card_top = bottom + card_h - px(6)
+        page.text(label, x + px(12), card_top, FONT, label_size, '#666666')
+        page.text(value, x + px(12), card_top - label_size * LINE_HEIGHT - px(1), BOLD_FONT, value_size, value_color)
+        x -= px(style.card_gap)
+
+    # padding-bottom, 3px accent border, margin-bottom
+    page.rule(bottom - px(12 + 1.5), px(3), ACCENT)
+    page.y = bottom - px(12 + 3 + 12)
+
+
+def _draw_table(page, table, style):
+    """One fixed-layout table: uppercase header repeated on every page, single-line cells cut to fit"""
+    columns = table.columns
+    total = sum(column.width for column in columns)
+    edges = [page.left]
+    for column in columns:
+        edges.append(edges[-1] + (page.right - page.left) * column.width / total)
+    v_pad, h_pad = (px(p) for p in style.padding)
+    size, header_size = px(style.font_size), px(style.header_size)
+    # Every row is one line, so heights are fixed instead of measured cell by cell
+    header_h = header_size * LINE_HEIGHT + 2 * v_pad
+    row_h = size * LINE_HEIGHT + 2 * v_pad
+
+    def anchor(c, align):
+        if align == 'right':
+            return edges[c + 1] - h_pad
+        if align == 'center':
+            return (edges[c] + edges[c + 1]) / 2
+        return edges[c] + h_pad
+
+    headers = [
+        _fit(column.title.upper(), BOLD_FONT, header_size, edges[c + 1] - edges[c] - 2 * h_pad)[0]
+        for c, column in enumerate(columns)
+    ]
+
+    def header_row():
+        page.band(page.y, header_h, '#f8f9fa')
+        for c, (column, title) in enumerate(zip(columns, headers)):
+            align = column.header_align or column.align
+            page.text(title, anchor(c, align), page.y - v_pad, BOLD_FONT, header_size, '#555555', align)
+        page.rule(page.y - header_h - px(1), px(2), '#dee2e6')
+        page.y -= header_h + px(2)
+
+    # A title or header row is never left alone at the bottom of a page
+    title_h = px(12 + 2 + 1 + 4) + px(10) * LINE_HEIGHT if table.title else 0
+    if not page.fits(title_h + header_h + row_h):
+        page.new_page()
+    if table.title:
+        page.text(table.title.upper(), page.left, page.y - px(12), BOLD_FONT, px(10), ACCENT)
+        page.rule(page.y - title_h + px(4.5), px(1), '#eeeeee')
+        page.y -= title_h
+    header_row()
+
+    canvas = page.canvas
+    for i, row in enumerate(table.rows):
+        if not page.fits(row_h):
+            page.new_page()
+            header_row()
+        highlighted = table.highlight_field is not None and row[table.highlight_field]
+        if highlighted:
+            page.band(page.y, row_h, HIGHLIGHT_BACKGROUND)
+        elif i % 2:
+            page.band(page.y, row_h, '#fafafa')
+        row_color = HIGHLIGHT_TEXT if highlighted else '#333333'
+
+        # One text object per row; font and color operators only where they change
+        text = canvas.beginText()
+        baseline = page.y - v_pad - size * BASELINE
+        font = color = None
+        for c, column in enumerate(columns):
+            value = row[column.field]
+            if column.blank is not None:
+                value = value or column.blank
+            cell_font, cell_color = BOLD_FONT if column.bold else FONT, row_color
+            if column.class_field is not None and row[column.class_field] in CLASS_STYLES:
+                cell_color, class_bold = CLASS_STYLES[row[column.class_field]]
+                if class_bold:
+                    cell_font = BOLD_FONT
+            if cell_font != font:
+                font = cell_font
+                text.setFont(font, size)
+            if cell_color != color:
+                color = cell_color
+                text.setFillColor(_color(color))
+            cell, cell_width = _fit(str(value), font, size, edges[c + 1] - edges[c] - 2 * h_pad)
+            x = anchor(c, column.align)
+            if column.align == 'right':
+                x -= cell_width
+            elif column.align == 'center':
+                x -= cell_width / 2
+            text.setTextOrigin(x, baseline)
+            text.textOut(cell)
+        canvas.drawText(text)
+        page.rule(page.y - row_h - px(0.5), px(1), '#eeeeee')
+        page.y -= row_h + px(1)
+
+    page.y -= px(style.table_gap)
+
+
+def draw_report(report, image_dpi=None):
+    """
+    PDF bytes for one agent's Report (runs in the parent or in a pool worker).
+    With `image_dpi`, the logo is embedded at that resolution of its printed size.
+    """
+    buffer = io.BytesIO()
+    # invariant: no timestamps or random IDs, so an unchanged agent yields identical bytes
+    canvas = Canvas(buffer, pagesize=landscape(A4), invariant=1)
+    canvas.setTitle(str(report.agent))
+    page = _Page(canvas)
+    _draw_header(page, report, image_dpi)
+    for table in report.tables:
+        _draw_table(page, table, report.style)
+    canvas.showPage()
+    canvas.save()
+    return buffer.getvalue()
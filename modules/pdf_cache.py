@@ -0,0 +1,115 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def default_cache_dir():
+    """ATLAS_CACHE_DIR if set, otherwise ~/.cache/atlas_reports"""
+    return Path(os.environ.get("ATLAS_CACHE_DIR", Path.home() / ".cache" / "atlas_reports"))
+
+
+def make_key(*parts):
+    """
+    Content hash of everything that ends up in a PDF.
+    DataFrames are hashed row by row (column names included), bytes as-is, anything else via str().
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, pd.DataFrame):
+            digest.update(repr(list(part.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(part, index=False).values.tobytes())
+        elif isinstance(part, bytes):
+            digest.update(part)
+        else:
+            digest.update(str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def source_version(*module_files):
+    """
+    Cache-key part for the Python code that turns rows into display cells (a report module,
+    formatting.py, ...): editing any of these files invalidates the PDFs they shaped, as
+    editing a template does through RenderContext.version.
+    """
+    return make_key(*(Path(path).read_bytes() for path in module_files))
+
+
+class PdfCache:
+    """
+    Persistent on-disk store of rendered PDFs keyed by make_key().
+    Least recently used entries are evicted once the directory exceeds `max_bytes`.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = Path(directory) if directory else default_cache_dir() / "pdf"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = sum(p.stat().st_size for p in self.directory.glob("*.pdf"))
+
+    def _path(self, key):
+        return self.directory / f"{key}.pdf"
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            pdf_bytes = path.read_bytes()
+            os.utime(path)  # mtime doubles as the LRU timestamp
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return pdf_bytes
+
+    def put(self, key, pdf_bytes):
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_bytes(pdf_bytes)
+            os.replace(tmp_path, path)
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
+            return
+        with self._lock:
+            self._size += len(pdf_bytes)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in self.directory.glob("*.pdf"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        self._size = sum(size for _, size, _ in entries)
+        # Drop down to 90% so a full cache doesn't evict on every single put
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if self._size <= target:
+                break
+            path.unlink(missing_ok=True)
+            self._size -= size
+
+    def clear(self):
+        with self._lock:
+            for path in self.directory.glob("*.pdf"):
+                path.unlink(missing_ok=True)
+            self._size = 0
+            self.hits = self.misses = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "bytes": self._size}
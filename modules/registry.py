@@ -0,0 +1,149 @@
+import importlib
+import sys
+from collections import namedtuple
+
+from .ingest import AgentPartitions
+
+# --- REPORT REGISTRY ---
+# Each format declares how to recognise an upload (from its sniffed headers, or once parsed)
+# and which generate_*_pdfs renders it. Report modules pull in WeasyPrint, so they are only
+# imported once their format is detected.
+# `agent_sheet` (None = first sheet) and `agent_columns` (first one present wins) locate
+# the agent codes counted before the full load.
+
+ReportFormat = namedtuple('ReportFormat', [
+    'name', 'label', 'spinner', 'module', 'entry_point', 'detect', 'sniff', 'agent_sheet', 'agent_columns',
+])
+
+
+def _single_sheet(data_source):
+    """The DataFrame of a single-sheet upload (first sheet of a workbook dict)"""
+    return list(data_source.values())[0] if isinstance(data_source, dict) else data_source
+
+
+def _lower_columns(columns):
+    return [str(c).lower().strip() for c in columns]
+
+
+def _first_header(sheets):
+    """Lower-cased header of the first sniffed sheet"""
+    return _lower_columns(next(iter(sheets.values())).columns) if sheets else []
+
+
+def _detect_axa(data_source):
+    if isinstance(data_source, dict) and 'Contratos' in data_source and 'Clientes' in data_source:
+        return data_source
+    return None
+
+
+def _detect_generali(data_source):
+    df = _single_sheet(data_source)
+    cols_lower = _lower_columns(df.columns)
+    if 'contract id' not in cols_lower:
+        return None
+    df.columns = cols_lower
+    return df
+
+
+def _detect_performance(data_source):
+    df = _single_sheet(data_source)
+    return df if 'account number' in _lower_columns(df.columns) else None
+
+
+def _sniff_axa(sheets):
+    return 'Contratos' in sheets and 'Clientes' in sheets
+
+
+def _sniff_generali(sheets):
+    return 'contract id' in _first_header(sheets)
+
+
+def _sniff_performance(sheets):
+    return 'account number' in _first_header(sheets)
+
+
+# Checked in order: the first format whose rule matches wins
+REPORTS = [
+    ReportFormat(
+        "AXA", "AXA Report (Multi-sheet)", "Generando Reportes AXA...",
+        "modules.report_axa", "generate_axa_pdfs", _detect_axa,
+        _sniff_axa, 'Contratos', ('Cod. Mediador', 'Asesor'),
+    ),
+    ReportFormat(
+        "Generali", "Generali Performance", "Generating Generali Reports...",
+        "modules.report_generali", "generate_generali_pdfs", _detect_generali,
+        _sniff_generali, None, ('agent',),
+    ),
+    ReportFormat(
+        "Performance", "Standard Performance", "Generating Performance Reports...",
+        "modules.report_performance", "generate_performance_pdfs", _detect_performance,
+        _sniff_performance, None, ('Agent',),
+    ),
+]
+REPORTS_BY_NAME = {report.name: report for report in REPORTS}
+
+
+def detect_report(data_source):
+    """(ReportFormat, data for its generator) for a parsed upload, or (None, None) if unrecognized"""
+    if isinstance(data_source, AgentPartitions):
+        # A streamed CSV is recognized from its header (renamed by detection like a parsed sheet)
+        report, _ = detect_report(data_source.header)
+        return (report, data_source) if report is not None else (None, None)
+    for report in REPORTS:
+        data = report.detect(data_source)
+        if data is not None:
+            return report, data
+    return None, None
+
+
+def sniff_report(sheets):
+    """ReportFormat matching the sniffed {sheet: SheetHeader} of an upload (see ingest.sniff_upload), or None"""
+    for report in REPORTS:
+        if report.sniff(sheets):
+            return report
+    return None
+
+
+def _agent_column(report, columns):
+    """The report's agent column among `columns` (matched case-insensitively), or None"""
+    present = {str(c).lower().strip(): c for c in columns}
+    return next((present[c.lower()] for c in report.agent_columns if c.lower() in present), None)
+
+
+def rows_estimate(report, sheets):
+    """
+    Approximate data rows of a sniffed upload (None if unknown), taken from the sniff itself.
+    The agent count is left to agent_rows after the targeted load: counting the agent column
+    up front costs nearly as much as the load (every cell of a workbook sheet is parsed).
+    """
+    return sheets[report.agent_sheet or next(iter(sheets))].rows_estimate
+
+
+def agent_rows(report, report_data):
+    """
+    Rows per agent of a parsed upload as a Series indexed by the agent column's values
+    (what generate_*_pdfs takes as `agents`), largest first; None if it has no agent column
+    """
+    if isinstance(report_data, AgentPartitions):
+        return report_data.counts.sort_values(ascending=False, kind='stable')
+    df = report_data[report.agent_sheet] if report.agent_sheet else _single_sheet(report_data)
+    column = _agent_column(report, df.columns)
+    if column is None:
+        return None
+    counts = df[column].value_counts()
+    return counts[counts > 0]  # categorical columns also count unused categories
+
+
+def load_generator(report, reload=False):
+    """
+    The report's generate_*_pdfs, importing its module on first use.
+    `reload` re-executes an already imported module (dev mode: picks up edits without a restart).
+    """
+    if isinstance(report, str):
+        report = REPORTS_BY_NAME[report]
+    module = sys.modules.get(report.module)
+    if module is None:
+        module = importlib.import_module(report.module)
+    elif reload:
+        module = importlib.reload(module)
+    return getattr(module, report.entry_point)
@@ -0,0 +1,320 @@
+import contextlib
+import multiprocessing
+import re
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+
+import jinja2
+from weasyprint import CSS, HTML, URLFetcher
+from weasyprint.text.fonts import FontConfiguration
+from weasyprint.urls import URLFetcherResponse
+
+from . import native_pdf
+from .assets import data_uri, load_asset
+from .metrics import RunMetrics
+from .pdf_cache import make_key
+from .settings import (
+    COMPACT_IMAGE_DPI, DEFAULT_PDF_BACKEND, DEFAULT_PDF_PROFILE, LARGE_AGENT_ROWS, ROWS_PER_PART,
+)
+
+# One unit of work per agent. `build` is a zero-argument callable so the agent's document
+# is made lazily in the parent, right before the PDF is needed. For the 'weasyprint' backend
+# it returns one HTML string (or a list of parts for large agents); for 'reportlab', a
+# native_pdf.Report.
+# `cache_key` (see pdf_cache.make_key) lets an unchanged agent skip rendering entirely.
+# `rows` is the agent's row count, only used for metrics.
+RenderJob = namedtuple('RenderJob', ['agent', 'filename', 'build', 'cache_key', 'rows'], defaults=(None, None))
+
+# Metrics stages of a job's two steps per backend: building its document, then drawing the PDF
+BACKEND_STAGES = {'weasyprint': ('jinja', 'weasyprint'), 'reportlab': ('prepare', 'reportlab')}
+
+# WeasyPrint options of each output profile (settings.PDF_PROFILES), given to both render()
+# (image options apply when an image is loaded) and write_pdf() (font and stream options).
+# The reportlab backend only uses 'dpi': its Helvetica is never embedded and its streams
+# are always compressed.
+PROFILE_OPTIONS = {
+    'standard': {},
+    'compact': {
+        'optimize_images': True, 'dpi': COMPACT_IMAGE_DPI, 'jpeg_quality': 85,
+        'full_fonts': False, 'hinting': False, 'uncompressed_pdf': False,
+    },
+}
+
+
+class RenderContext:
+    """
+    Compiled Jinja template plus stylesheet source for one report type.
+    Report modules build theirs once per process and reuse it for every agent.
+    `name` is the report type, used to label its batches in a render queue.
+    """
+
+    def __init__(self, template_src, css_src, filters=None, name=None):
+        env = jinja2.Environment(loader=jinja2.BaseLoader)
+        env.filters.update(filters or {})
+        self.template = env.from_string(template_src)
+        self.css_src = css_src
+        self.name = name
+        # Feeds the PDF cache key: editing the template or CSS invalidates old entries
+        self.version = make_key(template_src, css_src)
+
+    def render(self, **variables):
+        return self.template.render(**variables)
+
+    def render_rows(self, rows_var, rows, large_agent_rows=LARGE_AGENT_ROWS, **variables):
+        """
+        Renders one agent, feeding the `rows` DataFrame to the template's `rows_var` loop as tuples.
+        Above `large_agent_rows` rows (falsy disables) the rows are split into ROWS_PER_PART chunks,
+        each rendered as its own part with `continuation` set on all but the first.
+        """
+        if not large_agent_rows or len(rows) <= large_agent_rows:
+            return self.render(**{rows_var: rows.itertuples(index=False, name=None)}, **variables)
+        return [
+            self.render(
+                continuation=start > 0,
+                **{rows_var: rows.iloc[start:start + ROWS_PER_PART].itertuples(index=False, name=None)},
+                **variables,
+            )
+            for start in range(0, len(rows), ROWS_PER_PART)
+        ]
+
+
+@lru_cache(maxsize=None)
+def _font_config():
+    """One FontConfiguration per process, shared by every stylesheet and document"""
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=None)
+def _stylesheet(css_src):
+    """Parsed once per process (and per report type), then reused for every agent"""
+    return CSS(string=css_src, font_config=_font_config())
+
+
+class AssetFetcher(URLFetcher):
+    """
+    WeasyPrint URL fetcher serving local assets from memory (see assets.load_asset).
+    Anything that isn't a local file falls back to the default fetcher.
+    """
+
+    def fetch(self, url, headers=None):
+        asset = load_asset(url)
+        if asset is None:
+            return super().fetch(url, headers)
+        data, mime_type = asset
+        return URLFetcherResponse(url, body=data, headers={"Content-Type": mime_type})
+
+
+@lru_cache(maxsize=None)
+def _url_fetcher():
+    return AssetFetcher()
+
+
+@lru_cache(maxsize=None)
+def _image_cache(profile):
+    """
+    Decoded images keyed by URL, shared by every PDF this process writes with one profile
+    (WeasyPrint applies the image options when it first loads an image)
+    """
+    return {}
+
+
+def _render_pdf(html_out, css_src, profile=DEFAULT_PDF_PROFILE):
+    """
+    WeasyPrint layout for a single agent (runs in the parent or in a pool worker).
+    A list of HTML parts is laid out part by part and joined into one PDF.
+    """
+    options = PROFILE_OPTIONS[profile]
+    parts = [html_out] if isinstance(html_out, str) else html_out
+    documents = [
+        HTML(string=part, base_url=".", url_fetcher=_url_fetcher()).render(
+            stylesheets=[_stylesheet(css_src)], font_config=_font_config(), cache=_image_cache(profile), **options
+        )
+        for part in parts
+    ]
+    document = documents[0]
+    if len(documents) > 1:
+        document = document.copy([page for doc in documents for page in doc.pages])
+    return document.write_pdf(**options)
+
+
+def _timed_render_pdf(document, css_src, backend=DEFAULT_PDF_BACKEND, profile=DEFAULT_PDF_PROFILE):
+    """(pdf_bytes, seconds), timed where the layout runs rather than while waiting on the pool"""
+    start = time.perf_counter()
+    if backend == 'reportlab':
+        pdf_bytes = native_pdf.draw_report(document, image_dpi=PROFILE_OPTIONS[profile].get('dpi'))
+    else:
+        pdf_bytes = _render_pdf(document, css_src, profile)
+    return pdf_bytes, time.perf_counter() - start
+
+
+# Batches running side by side on threads (see jobs.MultiBatchJob) take turns for in-process
+# layouts: WeasyPrint's and ReportLab's per-process state isn't meant to be shared between threads
+_LAYOUT_LOCK = threading.Lock()
+
+
+def preview_html(document, css_src):
+    """One agent's HTML (every part of a large agent) with its stylesheet inlined, for display in a browser"""
+    parts = [document] if isinstance(document, str) else document
+    style = f"<style>{css_src}</style>"
+    html = "".join(parts)
+    return html.replace("<head>", f"<head>{style}", 1) if "<head>" in html else style + html
+
+
+# Local asset URLs in a document's HTML (the templates only reference the logo)
+_FILE_URL = re.compile(r'file://[^"\'\s)>]+')
+
+
+def _portable(document):
+    """
+    The document with its local file:// assets inlined as data: URIs, for render workers of a
+    queue (see task_queue), which may run on hosts without the submitter's files
+    """
+    if isinstance(document, native_pdf.Report):
+        return document._replace(logo_url=data_uri(document.logo_url))
+    if isinstance(document, str):
+        return _FILE_URL.sub(lambda match: data_uri(match.group()), document)
+    return [_portable(part) for part in document]
+
+
+def _describe(exc):
+    return f"{type(exc).__name__}: {exc}"
+
+
+def _executor(workers, queue=None, name=None):
+    if queue is not None:
+        return queue.executor(name)
+    if workers <= 1:
+        return contextlib.nullcontext()
+    # 'spawn' keeps workers clean of the parent's threads (Streamlit runs several)
+    ctx = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+
+
+def render_pdfs(jobs, context, workers=1, errors=None, cache=None, metrics=None, manifest=None,
+                backend=DEFAULT_PDF_BACKEND, profile=DEFAULT_PDF_PROFILE, queue=None, previews=None):
+    """
+    Turns RenderJobs into (filename, pdf_bytes) tuples, always in job order.
+    `context` is the report's RenderContext, whose stylesheet is applied to every PDF.
+    `backend` ('weasyprint' or 'reportlab', see settings.PDF_BACKENDS) must match what the jobs build,
+    and `profile` (see PROFILE_OPTIONS) must be part of their cache keys.
+
+    With workers > 1 the PDF layout is spread over a process pool while
+    the template render stays in this process. Jobs whose cache_key is found in
+    `cache` (a PdfCache) are served from disk without rendering. Agents that fail
+    are skipped and appended to `errors` as (agent, message) instead of aborting the batch.
+    Template and layout times and PDF sizes are recorded per agent in `metrics` (a RunMetrics).
+
+    With a `manifest` (an IncrementalOutput), jobs it reports unchanged since the last run
+    are not yielded at all, and every yielded job is recorded in it.
+
+    With a `queue` (a task_queue.TaskQueue) the layouts are queued as one batch of per-agent
+    tasks for render workers (worker.py), on this host or others sharing the queue directory,
+    instead of a local pool; `workers` is then ignored. Local assets (the logo) travel inlined
+    in the queued documents.
+
+    With a `previews` list, every job laid out by WeasyPrint appends (agent, html) to it as soon
+    as its HTML is built, before the PDF is rendered (see preview_html); jobs served from
+    `cache` still build their HTML for it.
+    """
+    if errors is None:
+        errors = []
+    if metrics is None:
+        metrics = RunMetrics()
+    if backend == 'reportlab' and native_pdf.REPORTLAB_VERSION is None:
+        raise RuntimeError("The 'reportlab' PDF backend needs the reportlab package (pip install reportlab)")
+
+    with _executor(workers, queue, context.name) as pool:
+        # Bounded window: keeps every core busy without holding the whole batch in memory
+        if queue is not None:
+            window = queue.max_in_flight
+        else:
+            window = workers * 2 if pool else 0
+        pending = deque()
+        try:
+            for job in jobs:
+                pending.append((job, _start(
+                    job, context, pool, cache, metrics, manifest, backend, profile, previews, portable=queue is not None
+                )))
+                while len(pending) > window:
+                    yield from _collect(*pending.popleft(), errors, cache, metrics, manifest, backend)
+
+            while pending:
+                yield from _collect(*pending.popleft(), errors, cache, metrics, manifest, backend)
+        except GeneratorExit:
+            # Closed early (cancelled batch): drop queued renders instead of waiting for them
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+
+# Outcome of a job whose previous PDF is still valid (incremental runs)
+_UNCHANGED = object()
+
+
+def _start(job, context, pool, cache, metrics, manifest, backend, profile, previews=None, portable=False):
+    """
+    Returns the job's PDF bytes, a Future for them, the exception that stopped it, or _UNCHANGED.
+    With `portable`, the document goes to the pool with its local assets inlined (see _portable).
+    """
+    if manifest is not None and manifest.unchanged(job):
+        metrics.agent(job.agent, 0.0, job.rows, cached=True)
+        return _UNCHANGED
+    if cache is not None and job.cache_key:
+        start = time.perf_counter()
+        pdf_bytes = cache.get(job.cache_key)
+        if pdf_bytes is not None:
+            metrics.agent(job.agent, time.perf_counter() - start, job.rows, cached=True)
+            if previews is not None and backend == 'weasyprint':
+                # The cached PDF skips the template, but a preview still shows the agent's HTML
+                with contextlib.suppress(Exception):
+                    previews.append((job.agent, preview_html(job.build(), context.css_src)))
+            return pdf_bytes
+    try:
+        build_stage, render_stage = BACKEND_STAGES[backend]
+        start = time.perf_counter()
+        document = job.build()
+        seconds = time.perf_counter() - start
+        metrics.add(build_stage, seconds)
+        metrics.agent(job.agent, seconds, job.rows)
+        if previews is not None and backend == 'weasyprint':
+            previews.append((job.agent, preview_html(document, context.css_src)))
+        if pool is None:
+            with _LAYOUT_LOCK:
+                pdf_bytes, seconds = _timed_render_pdf(document, context.css_src, backend, profile)
+            metrics.add(render_stage, seconds)
+            metrics.agent(job.agent, seconds)
+            if cache is not None and job.cache_key:
+                cache.put(job.cache_key, pdf_bytes)
+            return pdf_bytes
+        if portable:
+            document = _portable(document)
+        return pool.submit(_timed_render_pdf, document, context.css_src, backend, profile)
+    except Exception as e:
+        return e
+
+
+def _collect(job, outcome, errors, cache, metrics, manifest, backend):
+    metrics.agent_finished()
+    if outcome is _UNCHANGED:
+        return
+    if isinstance(outcome, Future):
+        try:
+            outcome, seconds = outcome.result()
+        except Exception as e:
+            outcome = e
+        else:
+            metrics.add(BACKEND_STAGES[backend][1], seconds)
+            metrics.agent(job.agent, seconds)
+            if cache is not None and job.cache_key:
+                cache.put(job.cache_key, outcome)
+
+    if isinstance(outcome, Exception):
+        errors.append((job.agent, _describe(outcome)))
+        return
+    if manifest is not None:
+        manifest.record(job)
+    metrics.agent_output(job.agent, len(outcome))
+    yield job.filename, outcome
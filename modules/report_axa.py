@@ -1,9 +1,19 @@
 import pandas as pd
-import jinja2
 import os
-import streamlit as st
-from weasyprint import HTML
-from pathlib import Path
+from functools import lru_cache, partial
+from .assets import asset_bytes
+from .agents import agent_directory, normalize_codes, unmapped_codes
+from . import formatting, native_pdf
+from .formatting import column_or, dates, euros, percent, sign_class
+from .metrics import RunMetrics
+from .native_pdf import Card, Column, DataTable
+from .pdf_cache import make_key, source_version
+from .rendering import LARGE_AGENT_ROWS, RenderContext, RenderJob, render_pdfs
+from .settings import DEFAULT_PDF_BACKEND, DEFAULT_PDF_PROFILE
+
+# Contract rows are formatted here and in formatting.py
+CODE_VERSION = source_version(__file__, formatting.__file__)
+
 
 # --- FORMATTING HELPERS ---
 def _fmt_eur(val):
@@ -20,101 +30,47 @@ def _fmt_pct(val):
     except (ValueError, TypeError):
         return "-"
 
-def generate_axa_pdfs(excel_dict, logo_url, report_date):
-    """
-    AXA Report Generator
-    - Updated: Removed 'Variación Patrimonial' from Product Summary
-    - Includes: 'Inversión actual' swap, column reordering, and Frozen Premium KPI cards
-    """
-    file_date_str = report_date.strftime("%Y%m%d")
-    display_date_str = report_date.strftime("%B %d, %Y")
+# --- HTML TEMPLATE ---
+STYLESHEET = """
+    * { box-sizing: border-box; }
+    @page { size: landscape; margin: 0.8cm; }
+    body { font-family: Helvetica, Arial, sans-serif; font-size: 8.5px; color: #333; margin: 0; padding: 0; } 
 
-    # 1. LOAD AGENT MAPPING FROM ASSETS
-    name_map = {}
-    try:
-        mapping_path = Path(__file__).parent.parent / "assets" / "agentes.csv"
-        if mapping_path.exists():
-            df_mapping = pd.read_csv(mapping_path)
-            df_mapping['code'] = df_mapping['code'].astype(str).str.strip().str.replace('.0', '', regex=False)
-            name_map = dict(zip(df_mapping['code'], df_mapping['name']))
-            print(f"✅ DEBUG: Loaded {len(name_map)} agents from agentes.csv")
-    except Exception as e:
-        print(f"❌ DEBUG: Error loading agentes.csv: {e}")
+    .header { border-bottom: 3px solid #232ECF; padding-bottom: 12px; margin-bottom: 12px; display: flex; justify-content: space-between; align-items: flex-end; }
+    .logo { max-width: 130px; margin-bottom: 5px; }
+    .report-title { font-size: 12px; font-weight: bold; color: #000; text-transform: uppercase; letter-spacing: 0.5px; }
 
-    # 2. DATA EXTRACTION & CLEANING
-    df_contratos = excel_dict.get('Contratos', pd.DataFrame())
-    df_clientes = excel_dict.get('Clientes', pd.DataFrame())
+    .header-right { text-align: right; }
+    .agent-name { font-size: 15px; font-weight: bold; color: #000; margin-bottom: 2px; }
+    .report-date { color: #666; font-size: 8px; margin-bottom: 8px; }
 
-    if df_contratos.empty or df_clientes.empty:
-        raise ValueError("El archivo AXA debe contener las hojas 'Contratos' y 'Clientes'.")
+    .card-container { display: flex; gap: 6px; justify-content: flex-end; }
+    .card { background: #ffffff; padding: 5px 8px; border: 1px solid #e0e0e0; border-radius: 6px; min-width: 105px; text-align: left; }
+    .card small { color: #666; font-size: 7px; text-transform: uppercase; display: block; line-height: 1.1; }
+    .card strong { font-size: 11px; color: #000; }
+    .card.alert { border-color: #cc0000; background-color: #fff5f5; }
+    .card.alert strong { color: #cc0000; }
 
-    df_contratos.columns = df_contratos.columns.str.strip()
-    df_clientes.columns = df_clientes.columns.str.strip()
+    .section-title { font-size: 10px; font-weight: bold; color: #232ECF; margin: 12px 0 4px 0; text-transform: uppercase; border-bottom: 1px solid #eee; padding-bottom: 2px;}
 
-    # Filter for Active Contracts
-    df_vigentes = df_contratos[df_contratos['Estado'] == 'Vigente'].copy()
-    
-    # Merge with Client names
-    df_cli_sub = df_clientes[['Cartera', 'Cliente']].drop_duplicates(subset='Cartera')
-    df_merged = pd.merge(df_vigentes, df_cli_sub, on='Cartera', how='left')
-
-    # Flag paralyzed contracts
-    df_merged['_paralizado'] = df_merged['Situación plan de primas'] == 'Plan de primas paralizado'
+    table { width: 100%; border-collapse: collapse; table-layout: fixed; margin-bottom: 12px; }
+    th, td { padding: 5px 3px; overflow: hidden; text-overflow: ellipsis; white-space: nowrap; border-bottom: 1px solid #eee; }
+    th { background: #f8f9fa; color: #555; font-weight: bold; border-bottom: 2px solid #dee2e6; font-size: 7.5px; text-transform: uppercase; }
 
-    # Detect the correct column for the Mediator/Agent
-    agent_col = 'Cod. Mediador' if 'Cod. Mediador' in df_merged.columns else 'Asesor'
+    .text-left { text-align: left; }
+    .text-center { text-align: center; }
+    .text-right { text-align: right; }
 
-    # Clean numeric columns
-    numeric_cols = ['Saldo actual', 'Inversión actual', 'Variación patrimonial actual', 'Prima', 'Rent. Desde inicio actual']
-    for col in numeric_cols:
-        if col in df_merged.columns:
-            df_merged[col] = pd.to_numeric(df_merged[col], errors='coerce').fillna(0)
+    tr:nth-child(even) { background-color: #fafafa; }
+    .positive { color: #008000; font-weight: bold; }
+    .negative { color: #cc0000; font-weight: bold; }
+    tr.paralizado td { background-color: #fff4e5; color: #cc5500; }
+"""
 
-    # Clean dates
-    if 'Fecha de adquisición' in df_merged.columns:
-        df_merged['Fecha de adquisición'] = pd.to_datetime(df_merged['Fecha de adquisición'], errors='coerce').dt.strftime('%d/%m/%Y').fillna('-')
-
-    # 3. HTML TEMPLATE
-    html_template = """
+HTML_TEMPLATE = """
     <!DOCTYPE html>
     <html lang="es">
-    <head>
-        <style>
-            * { box-sizing: border-box; }
-            @page { size: landscape; margin: 0.8cm; }
-            body { font-family: Helvetica, Arial, sans-serif; font-size: 8.5px; color: #333; margin: 0; padding: 0; } 
-            
-            .header { border-bottom: 3px solid #232ECF; padding-bottom: 12px; margin-bottom: 12px; display: flex; justify-content: space-between; align-items: flex-end; }
-            .logo { max-width: 130px; margin-bottom: 5px; }
-            .report-title { font-size: 12px; font-weight: bold; color: #000; text-transform: uppercase; letter-spacing: 0.5px; }
-            
-            .header-right { text-align: right; }
-            .agent-name { font-size: 15px; font-weight: bold; color: #000; margin-bottom: 2px; }
-            .report-date { color: #666; font-size: 8px; margin-bottom: 8px; }
-            
-            .card-container { display: flex; gap: 6px; justify-content: flex-end; }
-            .card { background: #ffffff; padding: 5px 8px; border: 1px solid #e0e0e0; border-radius: 6px; min-width: 105px; text-align: left; }
-            .card small { color: #666; font-size: 7px; text-transform: uppercase; display: block; line-height: 1.1; }
-            .card strong { font-size: 11px; color: #000; }
-            .card.alert { border-color: #cc0000; background-color: #fff5f5; }
-            .card.alert strong { color: #cc0000; }
-
-            .section-title { font-size: 10px; font-weight: bold; color: #232ECF; margin: 12px 0 4px 0; text-transform: uppercase; border-bottom: 1px solid #eee; padding-bottom: 2px;}
-            
-            table { width: 100%; border-collapse: collapse; table-layout: fixed; margin-bottom: 12px; }
-            th, td { padding: 5px 3px; overflow: hidden; text-overflow: ellipsis; white-space: nowrap; border-bottom: 1px solid #eee; }
-            th { background: #f8f9fa; color: #555; font-weight: bold; border-bottom: 2px solid #dee2e6; font-size: 7.5px; text-transform: uppercase; }
-
-            .text-left { text-align: left; }
-            .text-center { text-align: center; }
-            .text-right { text-align: right; }
-
-            tr:nth-child(even) { background-color: #fafafa; }
-            .positive { color: #008000; font-weight: bold; }
-            .negative { color: #cc0000; font-weight: bold; }
-            tr.paralizado td { background-color: #fff4e5; color: #cc5500; }
-        </style>
-    </head>
+    <head></head>
     <body>
         <div class="header">
             <div>
@@ -124,6 +80,7 @@ def generate_axa_pdfs(excel_dict, logo_url, report_date):
             <div class="header-right">
                 <div class="agent-name">{{ agent_display_name }}</div>
                 <div class="report-date">Valoración: {{ date }} | Cód: {{ agent_code }}</div>
+                {% if not continuation %}
                 <div class="card-container">
                     <div class="card"><small>Clientes</small><strong>{{ total_clientes }}</strong></div>
                     <div class="card"><small>Saldo Total</small><strong>{{ total_saldo | eur }}</strong></div>
@@ -134,9 +91,11 @@ def generate_axa_pdfs(excel_dict, logo_url, report_date):
                         <small>Mensual Parado</small><strong>{{ total_prima_paralizada | eur }}</strong>
                     </div>
                 </div>
+                {% endif %}
             </div>
         </div>
 
+        {% if not continuation %}
         <div class="section-title">Resumen por Producto</div>
         <table>
             <thead>
@@ -149,17 +108,18 @@ def generate_axa_pdfs(excel_dict, logo_url, report_date):
                 </tr>
             </thead>
             <tbody>
-                {% for p in productos %}
+                {% for nombre, n_contratos, inversion, saldo, prima_mens in productos %}
                 <tr>
-                    <td class="text-left">{{ p.nombre }}</td>
-                    <td class="text-center">{{ p.contratos }}</td>
-                    <td class="text-right">{{ p.inversion | eur }}</td>
-                    <td class="text-right"><strong>{{ p.saldo | eur }}</strong></td>
-                    <td class="text-right">{{ p.prima_mens | eur }}</td>
+                    <td class="text-left">{{ nombre }}</td>
+                    <td class="text-center">{{ n_contratos }}</td>
+                    <td class="text-right">{{ inversion }}</td>
+                    <td class="text-right"><strong>{{ saldo }}</strong></td>
+                    <td class="text-right">{{ prima_mens }}</td>
                 </tr>
                 {% endfor %}
             </tbody>
         </table>
+        {% endif %}
 
         <div class="section-title">Detalle de Contratos</div>
         <table>
@@ -177,78 +137,256 @@ def generate_axa_pdfs(excel_dict, logo_url, report_date):
                 </tr>
             </thead>
             <tbody>
-                {% for c in contratos %}
-                <tr class="{% if c._paralizado %}paralizado{% endif %}">
-                    <td class="text-left">{{ c.Cliente }}</td>
-                    <td class="text-left">{{ c.Cartera }}</td>
-                    <td class="text-left">{{ c.Producto }}</td>
-                    <td class="text-center">{{ c['Fecha de adquisición'] }}</td>
-                    <td class="text-right">{{ c.Prima | eur }}</td>
-                    <td class="text-center">{{ c['Periodicidad prima'] }}</td>
-                    <td class="text-right">{{ c['Inversión actual'] | eur }}</td>
-                    <td class="text-right"><strong>{{ c['Saldo actual'] | eur }}</strong></td>
-                    <td class="text-right">
-                        <span class="{% if c['Rent. Desde inicio actual'] > 0 %}positive{% elif c['Rent. Desde inicio actual'] < 0 %}negative{% endif %}">
-                            {{ c['Rent. Desde inicio actual'] | pct }}
-                        </span>
-                    </td>
+                {% for paralizado, cliente, cartera, producto, fecha, prima, periodicidad, inversion, saldo, rent, rent_class in contratos %}
+                <tr class="{% if paralizado %}paralizado{% endif %}">
+                    <td class="text-left">{{ cliente }}</td>
+                    <td class="text-left">{{ cartera }}</td>
+                    <td class="text-left">{{ producto }}</td>
+                    <td class="text-center">{{ fecha }}</td>
+                    <td class="text-right">{{ prima }}</td>
+                    <td class="text-center">{{ periodicidad }}</td>
+                    <td class="text-right">{{ inversion }}</td>
+                    <td class="text-right"><strong>{{ saldo }}</strong></td>
+                    <td class="text-right"><span class="{{ rent_class }}">{{ rent }}</span></td>
                 </tr>
                 {% endfor %}
             </tbody>
         </table>
     </body>
     </html>
+"""
+
+
+@lru_cache(maxsize=None)
+def get_render_context():
+    """Template and stylesheet compiled once per process"""
+    return RenderContext(HTML_TEMPLATE, STYLESHEET, {'eur': _fmt_eur, 'pct': _fmt_pct}, name='AXA')
+
+
+# Order of the cells unpacked by the template's row loops
+PRODUCT_COLUMNS = ['nombre', 'contratos', 'inversion', 'saldo', 'prima_mens']
+CONTRACT_COLUMNS = [
+    '_paralizado', 'Cliente', 'Cartera', 'Producto', '_fecha', '_prima', 'Periodicidad prima',
+    '_inversion', '_saldo', '_rent', '_rent_class',
+]
+
+# The template's tables for the 'reportlab' backend; fields index PRODUCT_COLUMNS / CONTRACT_COLUMNS
+NATIVE_PRODUCT_COLUMNS = [
+    Column('Producto', 0, 35, 'left'),
+    Column('Contratos', 1, 10, 'center'),
+    Column('Inversión Actual', 2, 18, 'right'),
+    Column('Saldo Actual', 3, 18, 'right', bold=True),
+    Column('Prima Mensual', 4, 19, 'right'),
+]
+NATIVE_CONTRACT_COLUMNS = [
+    Column('Cliente', 1, 18, 'left'),
+    Column('Cartera', 2, 11, 'left'),
+    Column('Producto', 3, 16, 'left'),
+    Column('F. Adquisición', 4, 8, 'center'),
+    Column('Prima', 5, 8, 'right'),
+    Column('Periodicidad', 6, 9, 'center'),
+    Column('Inversión Actual', 7, 10, 'right'),
+    Column('Saldo Actual', 8, 10, 'right', bold=True),
+    Column('Rent. Inicio', 9, 10, 'right', class_field=10),
+]
+NATIVE_STYLE = native_pdf.Style(
+    font_size=8.5, header_size=7.5, padding=(5, 3), logo_width=130, title_size=12, agent_size=15,
+    date_size=8, card_width=105, card_gap=6, card_label_size=7, card_value_size=11, table_gap=12,
+)
+
+
+def _contract_rows(agent_df):
+    """One agent's contracts as the template's display cells, in CONTRACT_COLUMNS order"""
+    return pd.DataFrame({
+        '_paralizado': agent_df['_paralizado'],
+        'Cliente': agent_df['Cliente'],
+        'Cartera': agent_df['Cartera'],
+        'Producto': agent_df['Producto'],
+        '_fecha': dates(agent_df['_fecha'], '%d/%m/%Y'),
+        '_prima': euros(agent_df['Prima']),
+        'Periodicidad prima': agent_df['Periodicidad prima'],
+        '_inversion': euros(agent_df['Inversión actual']),
+        '_saldo': euros(agent_df['Saldo actual']),
+        '_rent': percent(agent_df['Rent. Desde inicio actual']),
+        '_rent_class': sign_class(agent_df['Rent. Desde inicio actual']),
+    }, columns=CONTRACT_COLUMNS)
+
+
+def generate_axa_pdfs(excel_dict, logo_url, report_date, workers=1, errors=None, cache=None,
+                      large_agent_rows=LARGE_AGENT_ROWS, metrics=None, manifest=None,
+                      backend=DEFAULT_PDF_BACKEND, profile=DEFAULT_PDF_PROFILE, queue=None,
+                      agents=None, previews=None):
+    """
+    AXA Report Generator
+    - Updated: Removed 'Variación Patrimonial' from Product Summary
+    - Includes: 'Inversión actual' swap, column reordering, and Frozen Premium KPI cards
+    - Rendering: spread over `workers` processes, per-agent failures collected in `errors`
+    - Output: yields (filename, pdf_bytes) per agent as soon as it is rendered
+    - Caching: unchanged agents are served from `cache` (a PdfCache) when given
+    - Large agents: above `large_agent_rows` contracts the PDF is laid out in parts and joined
+    - Metrics: stage timings and counts go to `metrics` (a RunMetrics) when given
+    - Incremental: with a `manifest` (an IncrementalOutput) only new or changed agents are yielded
+    - Backend: 'weasyprint' lays out the HTML template, 'reportlab' draws the same tables (native_pdf)
+    - Output profile: 'compact' trades image resolution for smaller files (rendering.PROFILE_OPTIONS)
+    - Queue: with a `queue` (a TaskQueue) the layouts go to render workers instead of local processes
+    - Preview: `agents` (mediator codes as in the agent column) limits the run to those agents;
+      `previews` collects their HTML as it is built (rendering.render_pdfs)
     """
+    file_date_str = report_date.strftime("%Y%m%d")
+    display_date_str = report_date.strftime("%B %d, %Y")
+    if metrics is None:
+        metrics = RunMetrics()
 
-    env = jinja2.Environment(loader=jinja2.BaseLoader)
-    env.filters['eur'] = _fmt_eur
-    env.filters['pct'] = _fmt_pct
-    template = env.from_string(html_template)
-    
-    generated_files = []
+    # 1. LOAD AGENT MAPPING FROM ASSETS (parsed once, re-read only when agentes.csv changes)
+    name_map = {}
+    try:
+        name_map = agent_directory().names()
+        metrics.count('agent_names', len(name_map))
+    except Exception as e:
+        metrics.note(f"Error loading agentes.csv: {e}")
+
+    # 2. DATA EXTRACTION & CLEANING
+    df_contratos = excel_dict.get('Contratos', pd.DataFrame())
+    df_clientes = excel_dict.get('Clientes', pd.DataFrame())
+
+    if df_contratos.empty or df_clientes.empty:
+        raise ValueError("El archivo AXA debe contener las hojas 'Contratos' y 'Clientes'.")
+    metrics.count('input_rows', len(df_contratos))
+
+    with metrics.stage('clean'):
+        df_contratos.columns = df_contratos.columns.str.strip()
+        df_clientes.columns = df_clientes.columns.str.strip()
+
+        # Detect the correct column for the Mediator/Agent
+        agent_col = 'Cod. Mediador' if 'Cod. Mediador' in df_contratos.columns else 'Asesor'
+        if agents is not None:
+            df_contratos = df_contratos[df_contratos[agent_col].isin(agents)]
+
+        # Active contracts that have an agent, largest balance first (groupby keeps row order, so each
+        # agent's contracts come out sorted). This single take is the working copy: the columns below
+        # are added to it, never to the uploaded sheets
+        saldo = pd.to_numeric(df_contratos['Saldo actual'], errors='coerce').fillna(0)
+        active = (df_contratos['Estado'] == 'Vigente') & df_contratos[agent_col].notna()
+        df_vigentes = df_contratos.loc[saldo[active].sort_values(ascending=False, kind='stable').index]
+
+        # Client name per portfolio (first one listed in Clientes), looked up rather than merged in
+        clientes = df_clientes.drop_duplicates(subset='Cartera').set_index('Cartera')['Cliente']
+        df_vigentes['Cliente'] = df_vigentes['Cartera'].map(clientes)
+
+        # Flag paralyzed contracts
+        df_vigentes['_paralizado'] = df_vigentes['Situación plan de primas'] == 'Plan de primas paralizado'
+
+        # Mediator codes and display names for the whole column at once
+        df_vigentes['_code'] = normalize_codes(df_vigentes[agent_col])
+        df_vigentes['_agent_name'] = df_vigentes['_code'].map(name_map).fillna('Mediador ' + df_vigentes['_code'])
+
+        # Clean numeric columns
+        numeric_cols = ['Saldo actual', 'Inversión actual', 'Variación patrimonial actual', 'Prima', 'Rent. Desde inicio actual']
+        for col in numeric_cols:
+            if col in df_vigentes.columns:
+                df_vigentes[col] = pd.to_numeric(df_vigentes[col], errors='coerce').fillna(0)
+
+        # Dates stay parsed; they are formatted per agent with the rest of the contract cells
+        if 'Fecha de adquisición' in df_vigentes.columns:
+            df_vigentes['_fecha'] = pd.to_datetime(df_vigentes['Fecha de adquisición'], errors='coerce')
+        else:
+            df_vigentes['_fecha'] = column_or(df_vigentes, 'Fecha de adquisición', '')
+
+        # Pre-masked premiums, so every aggregate below is a plain column sum
+        df_vigentes['_prima_mensual'] = df_vigentes['Prima'].where(df_vigentes['Periodicidad prima'] == 'Mensual', 0)
+        df_vigentes['_prima_paralizada'] = df_vigentes['Prima'].where(df_vigentes['_paralizado'], 0)
+
+    # 3. RENDER CONTEXT (template + CSS compiled once per process)
+    context = get_render_context()
     
-    # 4. LOOP PER AGENT
-    valid_agents = df_merged.dropna(subset=[agent_col])
-    for agent_code, agent_df in valid_agents.groupby(agent_col):
-        
-        try:
-            code_key = str(int(float(agent_code)))
-        except:
-            code_key = str(agent_code).strip()
-        
-        real_name = name_map.get(code_key, f"Mediador {code_key}")
-
-        total_prima_paralizada = agent_df.loc[agent_df['_paralizado'], 'Prima'].sum()
+    layout = context.version if backend == 'weasyprint' else native_pdf.layout_version(__file__)
+    key_base = make_key(
+        layout, CODE_VERSION, profile, asset_bytes(logo_url), report_date.isoformat(), large_agent_rows
+    )
+
+    # 4. AGGREGATES FOR EVERY AGENT IN ONE PASS
+    with metrics.stage('groupby'):
+        by_agent = df_vigentes.groupby(agent_col, observed=True)
+
+        kpis = by_agent.agg(
+            total_clientes=('Cliente', 'nunique'),
+            total_saldo=('Saldo actual', 'sum'),
+            n_paralizados=('_paralizado', 'sum'),
+            total_prima_paralizada=('_prima_paralizada', 'sum'),
+        ).to_dict(orient='index')
+        metrics.count('agents', len(kpis))
+
+        unmapped = unmapped_codes(df_vigentes['_code'], name_map)
+        if unmapped:
+            metrics.count('unmapped_agents', len(unmapped))
+            metrics.note(
+                f"{len(unmapped)} mediator code(s) missing from agentes.csv, "
+                f"reported as 'Mediador <code>': {', '.join(unmapped)}"
+            )
 
         # Summary by Product Calculation (Variacion removed from agg)
-        prod_group = agent_df.groupby('Producto').agg(
+        productos = df_vigentes.groupby([agent_col, 'Producto'], observed=True).agg(
             contratos=('Cartera', 'count'),
             saldo=('Saldo actual', 'sum'),
             inversion=('Inversión actual', 'sum'),
-            prima_mens=('Prima', lambda x: x[agent_df.loc[x.index, 'Periodicidad prima'] == 'Mensual'].sum()),
-        ).reset_index()
+            prima_mens=('_prima_mensual', 'sum'),
+        ).reset_index(level='Producto').rename(columns={'Producto': 'nombre'})
+        for col in ['inversion', 'saldo', 'prima_mens']:
+            productos[col] = euros(productos[col])
 
-        productos_list = prod_group.rename(columns={'Producto': 'nombre'}).to_dict(orient='records')
+    def product_rows(agent_code):
+        # Per agent only slice lookups remain (agents with no named product have no summary rows)
+        agent_productos = productos.loc[[agent_code]] if agent_code in productos.index else productos.iloc[:0]
+        return agent_productos[PRODUCT_COLUMNS].itertuples(index=False, name=None)
 
+    def build_html(agent_code, agent_df, code_key, real_name):
         # Render HTML
-        html_out = template.render(
+        return context.render_rows(
+            'contratos', _contract_rows(agent_df), large_agent_rows,
             logo_url=logo_url,
             agent_display_name=real_name,
             agent_code=code_key,
             date=display_date_str,
             count=len(agent_df),
-            total_clientes=agent_df['Cliente'].nunique(),
-            total_saldo=agent_df['Saldo actual'].sum(),
-            n_paralizados=agent_df['_paralizado'].sum(),
-            total_prima_paralizada=total_prima_paralizada,
-            productos=productos_list,
-            contratos=agent_df.sort_values('Saldo actual', ascending=False).to_dict(orient='records')
+            productos=product_rows(agent_code),
+            **kpis[agent_code],
+        )
+
+    def build_report(agent_code, agent_df, code_key, real_name):
+        kpi = kpis[agent_code]
+        contracts = _contract_rows(agent_df).itertuples(index=False, name=None)
+        return native_pdf.Report(
+            logo_url, 'Cartera de AXA', real_name, f"Valoración: {display_date_str} | Cód: {code_key}",
+            [
+                Card('Clientes', kpi['total_clientes']),
+                Card('Saldo Total', _fmt_eur(kpi['total_saldo'])),
+                Card('Primas Paralizadas', kpi['n_paralizados'], kpi['n_paralizados'] > 0),
+                Card('Mensual Parado', _fmt_eur(kpi['total_prima_paralizada']), kpi['total_prima_paralizada'] > 0),
+            ],
+            [
+                DataTable('Resumen por Producto', NATIVE_PRODUCT_COLUMNS, list(product_rows(agent_code))),
+                DataTable('Detalle de Contratos', NATIVE_CONTRACT_COLUMNS, list(contracts), highlight_field=0),
+            ],
+            NATIVE_STYLE,
         )
-        
-        pdf_bytes = HTML(string=html_out, base_url=".").write_pdf()
-        
+
+    build = build_report if backend == 'reportlab' else build_html
+
+    def make_job(agent_code, agent_df):
+        code_key = agent_df['_code'].iat[0]
+        real_name = agent_df['_agent_name'].iat[0]
+
         safe_name = "".join([c for c in real_name if c.isalnum() or c in (' ', '_')]).strip().replace(' ', '_')
         filename = f"{file_date_str}_AXA_{safe_name}.pdf"
-        generated_files.append((filename, pdf_bytes))
-        
-    return generated_files
+        cache_key = make_key(key_base, code_key, real_name, agent_df)
+        return RenderJob(
+            code_key, filename, partial(build, agent_code, agent_df, code_key, real_name), cache_key, len(agent_df)
+        )
+
+    # 5. ONE JOB PER AGENT
+    # (rows taken per agent as its job is made, instead of iterating a regrouped copy of every agent)
+    jobs = (make_job(agent_code, by_agent.get_group(agent_code)) for agent_code in kpis)
+    yield from render_pdfs(
+        jobs, context, workers=workers, errors=errors, cache=cache, metrics=metrics, manifest=manifest,
+        backend=backend, profile=profile, queue=queue, previews=previews,
+    )
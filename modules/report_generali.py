@@ -1,127 +1,132 @@
+from functools import lru_cache, partial
+
 import pandas as pd
-import jinja2
-from weasyprint import HTML
+from .assets import asset_bytes
+from . import formatting, native_pdf, utils
+from .formatting import column_or, dates, money_or_dash, signed_percent
+from .ingest import AgentPartitions
+from .metrics import RunMetrics
+from .native_pdf import Card, Column, DataTable
+from .pdf_cache import make_key, source_version
+from .rendering import LARGE_AGENT_ROWS, RenderContext, RenderJob, render_pdfs
+from .settings import DEFAULT_PDF_BACKEND, DEFAULT_PDF_PROFILE
 from .utils import currency_format
 
 
-def generate_generali_pdfs(df, logo_url, report_date):
-    """
-    Generates PDFs for the Generali dataset with formatted dates.
-    """
+# Display rows are built here from formatting.py and utils.py helpers
+CODE_VERSION = source_version(__file__, formatting.__file__, utils.__file__)
 
-    file_date_str = report_date.strftime("%Y%m%d")
-    display_date_str = report_date.strftime("%B %d, %Y")
 
-    html_template = """
+STYLESHEET = """
+    * { box-sizing: border-box; }
+    @page { size: landscape; margin: 0.8cm; }
+    body {
+        font-family: Helvetica, Arial, sans-serif;
+        font-size: 9.5px;
+        color: #333;
+        margin: 0;
+        padding: 0;
+    }
+
+    /* ── HEADER ─────────────────────────────────────────────── */
+    .header {
+        border-bottom: 3px solid #232ECF;
+        padding-bottom: 12px;
+        margin-bottom: 12px;
+        display: flex;
+        justify-content: space-between;
+        align-items: flex-end;
+    }
+
+    .logo-container { display: flex; flex-direction: column; }
+    .logo { max-width: 140px; margin-bottom: 5px; }
+
+    .report-title {
+        font-size: 13px;
+        font-weight: bold;
+        color: #000;
+        text-transform: uppercase;
+        letter-spacing: 0.5px;
+    }
+
+    .header-right { text-align: right; }
+    .agent-name  { font-size: 16px; font-weight: bold; color: #000; margin-bottom: 2px; }
+    .report-date { color: #666; font-size: 9px; margin-bottom: 8px; }
+
+    /* ── SUMMARY CARDS ───────────────────────────────────────── */
+    .card-container { display: flex; gap: 10px; justify-content: flex-end; }
+    .card {
+        background: #ffffff;
+        padding: 6px 12px;
+        border: 1px solid #e0e0e0;
+        border-radius: 6px;
+        min-width: 160px;   /* grows with content instead of fixed 200px */
+        width: auto;
+        text-align: left;
+    }
+    .card small  { color: #666; font-size: 8px; text-transform: uppercase; display: block; }
+    .card strong { font-size: 14px; color: #000; }
+
+    /* ── TABLE BASE ──────────────────────────────────────────── */
+    table {
+        width: 100%;
+        border-collapse: collapse;
+        table-layout: fixed;
+        margin-top: 5px;
+    }
+
+    th, td {
+        padding: 7px 5px;           /* reduced from 10px → less wasted space */
+        overflow: hidden;
+        text-overflow: ellipsis;
+        white-space: nowrap;
+        border-bottom: 1px solid #eee;
+    }
+
+    th {
+        background: #f8f9fa;
+        color: #555;
+        font-weight: bold;
+        border-bottom: 2px solid #dee2e6;
+        font-size: 8.5px;
+        text-transform: uppercase;
+    }
+
+    tr:nth-child(even) { background-color: #fafafa; }
+
+    /* ── COLUMN WIDTHS ───────────────────────────────────────── */
+    /*  Total = 94%  (6% breathing room)                         */
+    th:nth-child(1), td:nth-child(1) { width: 26%; } /* Nombre Cliente  */
+    th:nth-child(2), td:nth-child(2) { width: 14%; } /* Póliza          */
+    th:nth-child(3), td:nth-child(3) { width:  8%; } /* Nº Fondos       */
+    th:nth-child(4), td:nth-child(4) { width: 10%; } /* Fecha Emisión   */
+    th:nth-child(5), td:nth-child(5) { width: 13%; } /* Capital Invertido */
+    th:nth-child(6), td:nth-child(6) { width: 13%; } /* Valor Neto      */
+    th:nth-child(7), td:nth-child(7) { width: 10%; } /* Rendimiento     */
+
+    /* ── COLUMN ALIGNMENT — HEADERS ─────────────────────────── */
+    th:nth-child(1) { text-align: left; }
+    th:nth-child(2) { text-align: center; }
+    th:nth-child(3), th:nth-child(4) { text-align: center; }
+    th:nth-child(5), th:nth-child(6),
+    th:nth-child(7)                  { text-align: right;  }
+
+    /* ── COLUMN ALIGNMENT — DATA CELLS ──────────────────────── */
+    td:nth-child(1) { text-align: left;   }
+    td:nth-child(2), td:nth-child(3), td:nth-child(4) { text-align: center; }
+    td:nth-child(5), td:nth-child(6),
+    td:nth-child(7)                  { text-align: right;  }
+
+    /* ── PERFORMANCE COLORS ──────────────────────────────────── */
+    .positive { color: #008000; font-weight: bold; }
+    .negative { color: #cc0000; font-weight: bold; }
+    .neutral  { color: #888888; }
+"""
+
+HTML_TEMPLATE = """
     <!DOCTYPE html>
     <html>
-    <head>
-        <style>
-            * { box-sizing: border-box; }
-            @page { size: landscape; margin: 0.8cm; }
-            body {
-                font-family: Helvetica, Arial, sans-serif;
-                font-size: 9.5px;
-                color: #333;
-                margin: 0;
-                padding: 0;
-            }
-
-            /* ── HEADER ─────────────────────────────────────────────── */
-            .header {
-                border-bottom: 3px solid #232ECF;
-                padding-bottom: 12px;
-                margin-bottom: 12px;
-                display: flex;
-                justify-content: space-between;
-                align-items: flex-end;
-            }
-
-            .logo-container { display: flex; flex-direction: column; }
-            .logo { max-width: 140px; margin-bottom: 5px; }
-
-            .report-title {
-                font-size: 13px;
-                font-weight: bold;
-                color: #000;
-                text-transform: uppercase;
-                letter-spacing: 0.5px;
-            }
-
-            .header-right { text-align: right; }
-            .agent-name  { font-size: 16px; font-weight: bold; color: #000; margin-bottom: 2px; }
-            .report-date { color: #666; font-size: 9px; margin-bottom: 8px; }
-
-            /* ── SUMMARY CARDS ───────────────────────────────────────── */
-            .card-container { display: flex; gap: 10px; justify-content: flex-end; }
-            .card {
-                background: #ffffff;
-                padding: 6px 12px;
-                border: 1px solid #e0e0e0;
-                border-radius: 6px;
-                min-width: 160px;   /* grows with content instead of fixed 200px */
-                width: auto;
-                text-align: left;
-            }
-            .card small  { color: #666; font-size: 8px; text-transform: uppercase; display: block; }
-            .card strong { font-size: 14px; color: #000; }
-
-            /* ── TABLE BASE ──────────────────────────────────────────── */
-            table {
-                width: 100%;
-                border-collapse: collapse;
-                table-layout: fixed;
-                margin-top: 5px;
-            }
-
-            th, td {
-                padding: 7px 5px;           /* reduced from 10px → less wasted space */
-                overflow: hidden;
-                text-overflow: ellipsis;
-                white-space: nowrap;
-                border-bottom: 1px solid #eee;
-            }
-
-            th {
-                background: #f8f9fa;
-                color: #555;
-                font-weight: bold;
-                border-bottom: 2px solid #dee2e6;
-                font-size: 8.5px;
-                text-transform: uppercase;
-            }
-
-            tr:nth-child(even) { background-color: #fafafa; }
-
-            /* ── COLUMN WIDTHS ───────────────────────────────────────── */
-            /*  Total = 94%  (6% breathing room)                         */
-            th:nth-child(1), td:nth-child(1) { width: 26%; } /* Nombre Cliente  */
-            th:nth-child(2), td:nth-child(2) { width: 14%; } /* Póliza          */
-            th:nth-child(3), td:nth-child(3) { width:  8%; } /* Nº Fondos       */
-            th:nth-child(4), td:nth-child(4) { width: 10%; } /* Fecha Emisión   */
-            th:nth-child(5), td:nth-child(5) { width: 13%; } /* Capital Invertido */
-            th:nth-child(6), td:nth-child(6) { width: 13%; } /* Valor Neto      */
-            th:nth-child(7), td:nth-child(7) { width: 10%; } /* Rendimiento     */
-
-            /* ── COLUMN ALIGNMENT — HEADERS ─────────────────────────── */
-            th:nth-child(1) { text-align: left; }
-            th:nth-child(2) { text-align: center; }
-            th:nth-child(3), th:nth-child(4) { text-align: center; }
-            th:nth-child(5), th:nth-child(6),
-            th:nth-child(7)                  { text-align: right;  }
-
-            /* ── COLUMN ALIGNMENT — DATA CELLS ──────────────────────── */
-            td:nth-child(1) { text-align: left;   }
-            td:nth-child(2), td:nth-child(3), td:nth-child(4) { text-align: center; }
-            td:nth-child(5), td:nth-child(6),
-            td:nth-child(7)                  { text-align: right;  }
-
-            /* ── PERFORMANCE COLORS ──────────────────────────────────── */
-            .positive { color: #008000; font-weight: bold; }
-            .negative { color: #cc0000; font-weight: bold; }
-            .neutral  { color: #888888; }
-        </style>
-    </head>
+    <head></head>
     <body>
         <div class="header">
             <div class="logo-container">
@@ -131,6 +136,7 @@ def generate_generali_pdfs(df, logo_url, report_date):
             <div class="header-right">
                 <div class="agent-name">{{ agent_name }}</div>
                 <div class="report-date">Fecha de Reporte: {{ date }}</div>
+                {% if not continuation %}
                 <div class="card-container">
                     <div class="card">
                         <small>Total de Contratos</small>
@@ -141,6 +147,7 @@ def generate_generali_pdfs(df, logo_url, report_date):
                         <strong>${{ total | currency }}</strong>
                     </div>
                 </div>
+                {% endif %}
             </div>
         </div>
 
@@ -157,66 +164,164 @@ def generate_generali_pdfs(df, logo_url, report_date):
                 </tr>
             </thead>
             <tbody>
-                {% for row in data %}
+                {% for client, contract, funds, issued, income, net_value, performance, performance_class in data %}
                 <tr>
-                    <td>{{ row.client }}</td>
-                    <td>{{ row['contract id'] }}</td>
-                    <td>{{ row['number of funds'] }}</td>
-                    <td>{{ row.date }}</td>
-                    <td>{% if row.income %}${{ row.income | currency }}{% else %}-{% endif %}</td>
-                    <td>{% if row['net value'] %}<strong>${{ row['net value'] | currency }}</strong>{% else %}-{% endif %}</td>
-                    <td>
-                        {% if row.performance != '' and row.performance is not none %}
-                            {% set perf = (row.performance | float * 100) | round(2) %}
-                            <span class="{% if perf > 0 %}positive{% elif perf < 0 %}negative{% else %}neutral{% endif %}">
-                                {% if perf > 0 %}+{% endif %}{{ perf }}%
-                            </span>
-                        {% else %}-{% endif %}
-                    </td>
+                    <td>{{ client }}</td>
+                    <td>{{ contract }}</td>
+                    <td>{{ funds }}</td>
+                    <td>{{ issued }}</td>
+                    <td>{{ income }}</td>
+                    <td>{% if net_value != '-' %}<strong>{{ net_value }}</strong>{% else %}-{% endif %}</td>
+                    <td><span class="{{ performance_class }}">{{ performance }}</span></td>
                 </tr>
                 {% endfor %}
             </tbody>
         </table>
     </body>
     </html>
-    """
+"""
 
-    env = jinja2.Environment(loader=jinja2.BaseLoader)
-    env.filters['currency'] = currency_format
-    template = env.from_string(html_template)
 
-    # --- DATE FORMATTING ---
-    if 'date' in df.columns:
-        df['date'] = (
-            pd.to_datetime(df['date'], errors='coerce')
-            .dt.strftime('%Y-%m-%d')
-            .fillna('-')
-        )
+@lru_cache(maxsize=None)
+def get_render_context():
+    """Template and stylesheet compiled once per process"""
+    return RenderContext(HTML_TEMPLATE, STYLESHEET, {'currency': currency_format}, name='Generali')
 
-    # --- NUMERIC COLUMNS ---
-    numeric_cols = ['net value', 'income', 'performance']
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+# Order of the cells unpacked by the template's row loop
+ROW_COLUMNS = ['client', 'contract', 'funds', 'issued', 'income', 'net_value', 'performance', 'performance_class']
+
+# The template's table for the 'reportlab' backend; fields index ROW_COLUMNS
+NATIVE_COLUMNS = [
+    Column('Nombre Cliente', 0, 26, 'left'),
+    Column('Póliza', 1, 14, 'center'),
+    Column('Nº Fondos', 2, 8, 'center'),
+    Column('Fecha Emisión', 3, 10, 'center'),
+    Column('Capital Invertido', 4, 13, 'right'),
+    Column('Valor Neto', 5, 13, 'right', bold=True),
+    Column('Rendimiento', 6, 10, 'right', class_field=7),
+]
+NATIVE_STYLE = native_pdf.Style(padding=(7, 5), card_width=160)
+
+
+def _display_rows(agent_table):
+    """One agent's typed rows as the template's display strings, in ROW_COLUMNS order"""
+    performance, performance_class = signed_percent(agent_table['performance'], neutral='neutral')
+    return pd.DataFrame({
+        'client': agent_table['client'],
+        'contract': agent_table['contract'],
+        'funds': agent_table['funds'],
+        'issued': dates(agent_table['issued'], '%Y-%m-%d'),
+        'income': money_or_dash(agent_table['income']),
+        'net_value': money_or_dash(agent_table['net_value']),
+        'performance': performance,
+        'performance_class': performance_class,
+    }, columns=ROW_COLUMNS)
+
+
+def _typed_table(df):
+    """The columns the report uses, typed (the caller's df is left as it is)"""
+    # Dates stay parsed here; build_html formats them only for the rows it renders
+    issued = pd.to_datetime(df['date'], errors='coerce') if 'date' in df.columns else column_or(df, 'date', '')
+
+    def numeric(col):
+        return pd.to_numeric(column_or(df, col, 0), errors='coerce').fillna(0)
+
+    return pd.DataFrame({
+        'client': column_or(df, 'client', ''),
+        'contract': column_or(df, 'contract id', ''),
+        'funds': column_or(df, 'number of funds', ''),
+        'issued': issued,
+        'income': numeric('income'),
+        'net_value': pd.to_numeric(df['net value'], errors='coerce').fillna(0),
+        'performance': numeric('performance'),
+    }, index=df.index)
+
+
+def generate_generali_pdfs(df, logo_url, report_date, workers=1, errors=None, cache=None,
+                           large_agent_rows=LARGE_AGENT_ROWS, metrics=None, manifest=None,
+                           backend=DEFAULT_PDF_BACKEND, profile=DEFAULT_PDF_PROFILE, queue=None,
+                           agents=None, previews=None):
+    """
+    Generates PDFs for the Generali dataset with formatted dates.
+    Yields (filename, pdf_bytes) per agent as soon as it is rendered.
+    Agents are rendered over `workers` processes; failures land in `errors`.
+    Unchanged agents are served from `cache` (a PdfCache) when given.
+    Agents above `large_agent_rows` rows are laid out in parts and joined.
+    Stage timings go to `metrics` (a RunMetrics) when given.
+    With a `manifest` (an IncrementalOutput) only new or changed agents are rendered and yielded.
+    `backend` picks the PDF engine: 'weasyprint' (HTML template) or 'reportlab' (native_pdf).
+    `profile` 'compact' trades image resolution for smaller files (see rendering.PROFILE_OPTIONS).
+    With a `queue` (a task_queue.TaskQueue) the layouts are rendered by its workers (worker.py).
+    `agents` (values of the agent column) limits the run to those agents, e.g. for a preview;
+    `previews` collects their HTML as it is built (see rendering.render_pdfs).
+    `df` may also be an AgentPartitions (a streamed CSV), rendered one agent's spill file at a time.
+    """
+
+    file_date_str = report_date.strftime("%Y%m%d")
+    display_date_str = report_date.strftime("%B %d, %Y")
+    context = get_render_context()
+    if metrics is None:
+        metrics = RunMetrics()
+    if isinstance(df, AgentPartitions):
+        # Streamed CSV: each agent's spill file is read and typed as its job is made
+        metrics.count('input_rows', df.rows)
+        metrics.count('agents', len(df.counts))
+        agent_tables = df.tables(_typed_table, agents, metrics)
+    else:
+        metrics.count('input_rows', len(df))
+        with metrics.stage('clean'):
+            if agents is not None:
+                df = df[df['agent'].isin(agents)]
+            table = _typed_table(df)
+
+        with metrics.stage('groupby'):
+            agent_tables = table.groupby(df['agent'], observed=True)
+            metrics.count('agents', agent_tables.ngroups)
 
     # --- GENERATE ONE PDF PER AGENT ---
-    generated_files = []
+    layout = context.version if backend == 'weasyprint' else native_pdf.layout_version(__file__)
+    key_base = make_key(
+        layout, CODE_VERSION, profile, asset_bytes(logo_url), report_date.isoformat(), large_agent_rows
+    )
 
-    for agent_name, agent_df in df.groupby('agent'):
-        total_net_value = agent_df['net value'].sum()
+    def build_html(agent_name, agent_table):
+        total_net_value = agent_table['net_value'].sum()
 
-        html_out = template.render(
+        return context.render_rows(
+            'data', _display_rows(agent_table), large_agent_rows,
             logo_url=logo_url,
             agent_name=agent_name,
             date=display_date_str,
-            count=len(agent_df),
+            count=len(agent_table),
             total=total_net_value,
-            data=agent_df.to_dict(orient='records'),
         )
 
-        pdf_bytes = HTML(string=html_out, base_url=".").write_pdf()
+    def build_report(agent_name, agent_table):
+        rows = _display_rows(agent_table).itertuples(index=False, name=None)
+        return native_pdf.Report(
+            logo_url, 'Resumen de Cartera de Inversiones - GENERALI', str(agent_name),
+            f"Fecha de Reporte: {display_date_str}",
+            [
+                Card('Total de Contratos', len(agent_table)),
+                Card('Valor Neto Total', f"${currency_format(agent_table['net_value'].sum())}"),
+            ],
+            [DataTable(None, NATIVE_COLUMNS, list(rows))],
+            NATIVE_STYLE,
+        )
+
+    build = build_report if backend == 'reportlab' else build_html
+
+    def make_job(agent_name, agent_table):
         safe_agent = str(agent_name).replace(' ', '_').replace('/', '-')
         filename = f"{file_date_str}_Generali_{safe_agent}.pdf"
-        generated_files.append((filename, pdf_bytes))
+        cache_key = make_key(key_base, agent_name, agent_table)
+        return RenderJob(
+            agent_name, filename, partial(build, agent_name, agent_table), cache_key, len(agent_table)
+        )
 
-    return generated_files
+    jobs = (make_job(agent_name, agent_table) for agent_name, agent_table in agent_tables)
+    yield from render_pdfs(
+        jobs, context, workers=workers, errors=errors, cache=cache, metrics=metrics, manifest=manifest,
+        backend=backend, profile=profile, queue=queue, previews=previews,
+    )
@@ -1,52 +1,62 @@
+from functools import lru_cache, partial
+
 import pandas as pd
-import jinja2
-from weasyprint import HTML
+from .assets import asset_bytes
+from . import formatting, native_pdf, utils
+from .formatting import column_or, dates, money_or_dash, signed_percent
+from .ingest import AgentPartitions
+from .metrics import RunMetrics
+from .native_pdf import Card, Column, DataTable
+from .pdf_cache import make_key, source_version
+from .rendering import LARGE_AGENT_ROWS, RenderContext, RenderJob, render_pdfs
+from .settings import DEFAULT_PDF_BACKEND, DEFAULT_PDF_PROFILE
 from .utils import currency_format 
 
-def generate_performance_pdfs(df, logo_url, report_date):
-    file_date_str = report_date.strftime("%Y%m%d")
-    display_date_str = report_date.strftime("%B %d, %Y")
+# Display rows are built here from formatting.py and utils.py helpers
+CODE_VERSION = source_version(__file__, formatting.__file__, utils.__file__)
+
+
+STYLESHEET = """
+    * { box-sizing: border-box; }
+    @page { size: landscape; margin: 0.8cm; }
+    body { font-family: Helvetica, Arial, sans-serif; font-size: 9.5px; color: #333; margin: 0; } 
+
+    .header { border-bottom: 3px solid #232ECF; padding-bottom: 12px; margin-bottom: 12px; display: flex; justify-content: space-between; align-items: flex-start; }
+    .logo { max-width: 140px; }
+    .header-right { text-align: right; }
+    .agent-name { font-size: 16px; font-weight: bold; color: #000; margin-bottom: 2px; }
+    .report-date { color: #666; font-size: 9px; margin-bottom: 8px; }
+
+    .card-container { display: flex; gap: 10px; justify-content: flex-end; }
+    .card { background: #ffffff; padding: 6px 12px; border: 1px solid #e0e0e0; border-radius: 6px; width: 190px; text-align: left; }
+    .card small { color: #666; font-size: 8px; text-transform: uppercase; display: block; }
+    .card strong { font-size: 14px; color: #000; }
 
-    html_template = """
+    table { width: 100%; border-collapse: collapse; table-layout: fixed; margin-top: 5px; }
+    th, td { padding: 10px 5px; overflow: hidden; text-overflow: ellipsis; white-space: nowrap; border-bottom: 1px solid #eee; }
+    th { background: #f8f9fa; color: #555; font-weight: bold; border-bottom: 2px solid #dee2e6; font-size: 8.5px; text-transform: uppercase; }
+
+    /* Alignment Logic: First 4 columns Left, Last 3 Center Header/Right Data */
+    th:nth-child(-n+4), td:nth-child(-n+4) { text-align: left; }
+    th:nth-child(n+5) { text-align: center; }
+    td:nth-child(n+5) { text-align: right; }
+
+    tr:nth-child(even) { background-color: #fafafa; }
+    .positive { color: #008000; font-weight: bold; }
+    .negative { color: #cc0000; font-weight: bold; }
+"""
+
+HTML_TEMPLATE = """
     <!DOCTYPE html>
     <html>
-    <head>
-        <style>
-            * { box-sizing: border-box; }
-            @page { size: landscape; margin: 0.8cm; }
-            body { font-family: Helvetica, Arial, sans-serif; font-size: 9.5px; color: #333; margin: 0; } 
-            
-            .header { border-bottom: 3px solid #232ECF; padding-bottom: 12px; margin-bottom: 12px; display: flex; justify-content: space-between; align-items: flex-start; }
-            .logo { max-width: 140px; }
-            .header-right { text-align: right; }
-            .agent-name { font-size: 16px; font-weight: bold; color: #000; margin-bottom: 2px; }
-            .report-date { color: #666; font-size: 9px; margin-bottom: 8px; }
-            
-            .card-container { display: flex; gap: 10px; justify-content: flex-end; }
-            .card { background: #ffffff; padding: 6px 12px; border: 1px solid #e0e0e0; border-radius: 6px; width: 190px; text-align: left; }
-            .card small { color: #666; font-size: 8px; text-transform: uppercase; display: block; }
-            .card strong { font-size: 14px; color: #000; }
-
-            table { width: 100%; border-collapse: collapse; table-layout: fixed; margin-top: 5px; }
-            th, td { padding: 10px 5px; overflow: hidden; text-overflow: ellipsis; white-space: nowrap; border-bottom: 1px solid #eee; }
-            th { background: #f8f9fa; color: #555; font-weight: bold; border-bottom: 2px solid #dee2e6; font-size: 8.5px; text-transform: uppercase; }
-
-            /* Alignment Logic: First 4 columns Left, Last 3 Center Header/Right Data */
-            th:nth-child(-n+4), td:nth-child(-n+4) { text-align: left; }
-            th:nth-child(n+5) { text-align: center; }
-            td:nth-child(n+5) { text-align: right; }
-
-            tr:nth-child(even) { background-color: #fafafa; }
-            .positive { color: #008000; font-weight: bold; }
-            .negative { color: #cc0000; font-weight: bold; }
-        </style>
-    </head>
+    <head></head>
     <body>
         <div class="header">
             <img src="{{ logo_url }}" class="logo">
             <div class="header-right">
                 <div class="agent-name">{{ agent_name }}</div>
                 <div class="report-date">Report Date: {{ date }}</div>
+                {% if not continuation %}
                 <div class="card-container">
                     <div class="card">
                         <small>Total Accounts</small>
@@ -57,6 +67,7 @@ def generate_performance_pdfs(df, logo_url, report_date):
                         <strong>${{ total | currency }}</strong>
                     </div>
                 </div>
+                {% endif %}
             </div>
         </div>
 
@@ -73,54 +84,143 @@ def generate_performance_pdfs(df, logo_url, report_date):
                 </tr>
             </thead>
             <tbody>
-                {% for client in clients %}
+                {% for name, account, portfolio, opened, net_deposit, balance, performance, performance_class in clients %}
                 <tr>
-                    <td>{{ client.Name }}</td>
-                    <td>{{ client['Account Number'] }}</td>
-                    <td>{{ client.Portfolio or '-' }}</td>
-                    <td>{{ client.Date }}</td> 
-                    <td>{% if client['Net Deposit'] %}${{ client['Net Deposit'] | currency }}{% else %}-{% endif %}</td>
-                    <td>{% if client.Balance %}<strong>${{ client.Balance | currency }}</strong>{% else %}-{% endif %}</td>
-                    <td>
-                        {% if client.Performance != '' and client.Performance is not none %}
-                            {% set perf = (client.Performance | float * 100) | round(2) %}
-                            <span class="{% if perf > 0 %}positive{% elif perf < 0 %}negative{% endif %}">
-                                {% if perf > 0 %}+{% endif %}{{ perf }}%
-                            </span>
-                        {% else %}-{% endif %}
-                    </td>
+                    <td>{{ name }}</td>
+                    <td>{{ account }}</td>
+                    <td>{{ portfolio or '-' }}</td>
+                    <td>{{ opened }}</td> 
+                    <td>{{ net_deposit }}</td>
+                    <td>{% if balance != '-' %}<strong>{{ balance }}</strong>{% else %}-{% endif %}</td>
+                    <td><span class="{{ performance_class }}">{{ performance }}</span></td>
                 </tr>
                 {% endfor %}
             </tbody>
         </table>
     </body>
     </html>
+"""
+
+
+@lru_cache(maxsize=None)
+def get_render_context():
+    """Template and stylesheet compiled once per process"""
+    return RenderContext(HTML_TEMPLATE, STYLESHEET, {'currency': currency_format}, name='Performance')
+
+
+# Order of the cells unpacked by the template's row loop
+ROW_COLUMNS = ['name', 'account', 'portfolio', 'opened', 'net_deposit', 'balance', 'performance', 'performance_class']
+
+# The template's table for the 'reportlab' backend; fields index ROW_COLUMNS
+NATIVE_COLUMNS = [
+    Column('Client', 0, 30, 'left'),
+    Column('Account ID', 1, 10, 'left'),
+    Column('Portfolio', 2, 15, 'left', blank='-'),
+    Column('Opened', 3, 10, 'left'),
+    Column('Net Invested', 4, 11, 'right', 'center'),
+    Column('Market Value', 5, 12, 'right', 'center', bold=True),
+    Column('Total Return', 6, 12, 'right', 'center', class_field=7),
+]
+NATIVE_STYLE = native_pdf.Style()
+
+
+def _display_rows(agent_table):
+    """One agent's typed rows as the template's display strings, in ROW_COLUMNS order"""
+    performance, performance_class = signed_percent(agent_table['performance'])
+    return pd.DataFrame({
+        'name': agent_table['name'],
+        'account': agent_table['account'],
+        'portfolio': agent_table['portfolio'],
+        'opened': dates(agent_table['opened'], '%Y-%m-%d'),
+        'net_deposit': money_or_dash(agent_table['net_deposit']),
+        'balance': money_or_dash(agent_table['balance']),
+        'performance': performance,
+        'performance_class': performance_class,
+    }, columns=ROW_COLUMNS)
+
+
+def _typed_table(df):
+    """
+    Typed columns only, built next to the caller's df rather than into it; display strings
+    are made per agent in build_html, for the rows actually rendered
     """
+    opened = pd.to_datetime(df['Date'], errors='coerce') if 'Date' in df.columns else column_or(df, 'Date', '')
+    return pd.DataFrame({
+        'name': column_or(df, 'Name', ''),
+        'account': column_or(df, 'Account Number', ''),
+        'portfolio': column_or(df, 'Portfolio', None),
+        'opened': opened,
+        'net_deposit': pd.to_numeric(df['Net Deposit'], errors='coerce'),
+        'balance': pd.to_numeric(df['Balance'], errors='coerce'),
+        'performance': pd.to_numeric(df['Performance'], errors='coerce'),
+    }, index=df.index)
+
 
-    env = jinja2.Environment(loader=jinja2.BaseLoader)
-    env.filters['currency'] = currency_format
-    template = env.from_string(html_template)
-    
-    if 'Date' in df.columns:
-        df['Date'] = pd.to_datetime(df['Date'], errors='coerce').dt.strftime('%Y-%m-%d').fillna('-')
+def generate_performance_pdfs(df, logo_url, report_date, workers=1, errors=None, cache=None,
+                              large_agent_rows=LARGE_AGENT_ROWS, metrics=None, manifest=None,
+                              backend=DEFAULT_PDF_BACKEND, profile=DEFAULT_PDF_PROFILE, queue=None,
+                              agents=None, previews=None):
+    file_date_str = report_date.strftime("%Y%m%d")
+    display_date_str = report_date.strftime("%B %d, %Y")
+    context = get_render_context()
+    if metrics is None:
+        metrics = RunMetrics()
+    if isinstance(df, AgentPartitions):
+        # Streamed CSV: each agent's spill file is read and typed as its job is made
+        metrics.count('input_rows', df.rows)
+        metrics.count('agents', len(df.counts))
+        agent_tables = df.tables(_typed_table, agents, metrics)
+    else:
+        metrics.count('input_rows', len(df))
+        with metrics.stage('clean'):
+            if agents is not None:
+                df = df[df['Agent'].isin(agents)]
+            table = _typed_table(df)
 
-    numeric_cols = ['Balance', 'Net Deposit', 'Performance']
-    for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
+        with metrics.stage('groupby'):
+            agent_tables = table.groupby(df['Agent'], observed=True)
+            metrics.count('agents', agent_tables.ngroups)
 
-    generated_files = []
-    for agent_name, agent_df in df.groupby('Agent'):
-        html_out = template.render(
+    # Everything besides the agent's rows that shapes the PDF
+    layout = context.version if backend == 'weasyprint' else native_pdf.layout_version(__file__)
+    key_base = make_key(
+        layout, CODE_VERSION, profile, asset_bytes(logo_url), report_date.isoformat(), large_agent_rows
+    )
+
+    def build_html(agent_name, agent_table):
+        return context.render_rows(
+            'clients', _display_rows(agent_table), large_agent_rows,
             logo_url=logo_url,
             agent_name=agent_name,
             date=display_date_str,
-            count=len(agent_df),
-            total=agent_df['Balance'].sum(),
-            clients=agent_df.to_dict(orient='records')
+            count=len(agent_table),
+            total=agent_table['balance'].sum(),
+        )
+
+    def build_report(agent_name, agent_table):
+        rows = _display_rows(agent_table).itertuples(index=False, name=None)
+        return native_pdf.Report(
+            logo_url, None, str(agent_name), f"Report Date: {display_date_str}",
+            [
+                Card('Total Accounts', len(agent_table)),
+                Card('Total AUM', f"${currency_format(agent_table['balance'].sum())}"),
+            ],
+            [DataTable(None, NATIVE_COLUMNS, list(rows))],
+            NATIVE_STYLE,
+        )
+
+    build = build_report if backend == 'reportlab' else build_html
+    jobs = (
+        RenderJob(
+            agent_name,
+            f"{file_date_str}_Performance_{str(agent_name).replace(' ', '_')}.pdf",
+            partial(build, agent_name, agent_table),
+            make_key(key_base, agent_name, agent_table),
+            len(agent_table),
         )
-        # CRITICAL FIX: Added base_url="."
-        pdf_bytes = HTML(string=html_out, base_url=".").write_pdf()
-        filename = f"{file_date_str}_Performance_{str(agent_name).replace(' ', '_')}.pdf"
-        generated_files.append((filename, pdf_bytes))
-        
-    return generated_files
+        for agent_name, agent_table in agent_tables
+    )
+    yield from render_pdfs(
+        jobs, context, workers=workers, errors=errors, cache=cache, metrics=metrics, manifest=manifest,
+        backend=backend, profile=profile, queue=queue, previews=previews,
+    )
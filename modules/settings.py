@@ -0,0 +1,27 @@
+# Defaults shared by the UI, the CLI and the renderers. Kept free of heavy imports
+# so the app can read them without loading WeasyPrint.
+from importlib.util import find_spec
+
+# Agents above this many table rows are laid out in parts of ROWS_PER_PART rows (about
+# 15-20 landscape pages each) and joined into one PDF, instead of one huge table
+LARGE_AGENT_ROWS = 1500
+ROWS_PER_PART = 500
+
+# PDF backends, selectable per run. 'weasyprint' lays out the HTML templates and is the
+# reference output; 'reportlab' draws the same header, cards and tables straight to PDF
+# (see native_pdf) and needs the optional reportlab package. Each is named after the
+# package it imports.
+PDF_BACKENDS = ('weasyprint', 'reportlab')
+DEFAULT_PDF_BACKEND = 'weasyprint'
+
+# Output profiles, selectable per run. 'standard' is the renderer's default output; 'compact'
+# is for batches sent by mail or through the file share: images are re-encoded and resampled to
+# COMPACT_IMAGE_DPI at their printed size, and embedded fonts are subset without hinting.
+PDF_PROFILES = ('standard', 'compact')
+DEFAULT_PDF_PROFILE = 'standard'
+COMPACT_IMAGE_DPI = 150
+
+
+def available_backends():
+    """PDF_BACKENDS whose package is installed, checked without importing it"""
+    return [backend for backend in PDF_BACKENDS if find_spec(backend) is not None]
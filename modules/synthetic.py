@@ -0,0 +1,125 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# --- SYNTHETIC INPUTS FOR BENCHMARKS AND DEMOS ---
+# Same columns and value shapes as the real uploads. Agent sizes follow a long tail
+# (a few agents own most rows), like the production books.
+
+PORTFOLIOS = ['Conservative', 'Balanced', 'Growth', 'Aggressive', 'Income']
+AXA_PRODUCTS = ['Ahorro Flexible', 'Plan Pensiones', 'Unit Linked', 'Vida Riesgo', 'Inversión Garantizada']
+
+
+def _agent_weights(agents):
+    weights = 1 / np.arange(1, agents + 1) ** 0.8
+    return weights / weights.sum()
+
+
+def _assign_agents(rng, rows, labels):
+    """Every agent gets at least one row; the rest follow the long-tail weights"""
+    labels = np.asarray(labels, dtype=object)
+    rows = max(rows, len(labels))
+    extra = rng.choice(labels, size=rows - len(labels), p=_agent_weights(len(labels)))
+    return rng.permutation(np.concatenate([labels, extra]))
+
+
+def _dates(rng, rows, start='2010-01-01', end='2024-12-31'):
+    days = (pd.Timestamp(end) - pd.Timestamp(start)).days
+    return pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days, rows), unit='D')
+
+
+def _agent_codes(agents):
+    """Real codes from agentes.csv first (so names resolve), then made-up ones"""
+    codes = []
+    mapping_path = Path(__file__).parent.parent / "assets" / "agentes.csv"
+    if mapping_path.exists():
+        codes = pd.read_csv(mapping_path, encoding='utf-8-sig')['code'].astype(int).tolist()
+    codes = codes[:agents]
+    return codes + list(range(900000, 900000 + agents - len(codes)))
+
+
+def performance_frame(rows, agents, seed=0):
+    """Standard Performance upload ('Account Number' / 'Agent')"""
+    rng = np.random.default_rng(seed)
+    agent = _assign_agents(rng, rows, [f"Agent {i:03d}" for i in range(agents)])
+    rows = len(agent)
+    balance = rng.lognormal(11, 1.2, rows).round(2)
+    return pd.DataFrame({
+        'Agent': agent,
+        'Name': [f"Client {i:06d}" for i in range(rows)],
+        'Account Number': rng.integers(10_000_000, 99_999_999, rows),
+        'Portfolio': rng.choice(PORTFOLIOS, rows),
+        'Date': _dates(rng, rows),
+        'Net Deposit': (balance * rng.uniform(0.6, 1.1, rows)).round(2),
+        'Balance': balance,
+        'Performance': rng.normal(0.05, 0.12, rows).round(4),
+    })
+
+
+def generali_frame(rows, agents, seed=0):
+    """Generali upload ('contract id' / 'agent')"""
+    rng = np.random.default_rng(seed)
+    agent = _assign_agents(rng, rows, [f"Generali Agent {i:03d}" for i in range(agents)])
+    rows = len(agent)
+    return pd.DataFrame({
+        'agent': agent,
+        'client': [f"Cliente {i:06d}" for i in range(rows)],
+        'contract id': [f"GX{i:08d}" for i in range(rows)],
+        'number of funds': rng.integers(1, 8, rows),
+        'date': _dates(rng, rows),
+        'income': rng.lognormal(9, 1.0, rows).round(2),
+        'net value': rng.lognormal(10, 1.1, rows).round(2),
+        'performance': rng.normal(0.03, 0.10, rows).round(4),
+    })
+
+
+def axa_workbook(rows, agents, seed=0):
+    """AXA upload: {'Contratos': ..., 'Clientes': ...}, about 3 contracts per client"""
+    rng = np.random.default_rng(seed)
+    codes = _assign_agents(rng, rows, _agent_codes(agents))
+    rows = len(codes)
+    n_clients = max(1, rows // 3)
+    cartera = rng.integers(0, n_clients, rows)
+    inversion = rng.lognormal(9.5, 1.0, rows).round(2)
+    contratos = pd.DataFrame({
+        'Cod. Mediador': codes.astype(float),
+        'Asesor': [f"Asesor {c}" for c in codes],
+        'Cartera': [f"CA{c:07d}" for c in cartera],
+        'Producto': rng.choice(AXA_PRODUCTS, rows),
+        'Estado': rng.choice(['Vigente', 'Anulado', 'Rescatado'], rows, p=[0.85, 0.1, 0.05]),
+        'Situación plan de primas': rng.choice(['Plan de primas activo', 'Plan de primas paralizado'], rows, p=[0.9, 0.1]),
+        'Fecha de adquisición': _dates(rng, rows),
+        'Prima': rng.choice([30, 50, 100, 150, 300, 600], rows).astype(float),
+        'Periodicidad prima': rng.choice(['Mensual', 'Trimestral', 'Anual'], rows, p=[0.7, 0.1, 0.2]),
+        'Inversión actual': inversion,
+        'Saldo actual': (inversion * rng.uniform(0.8, 1.4, rows)).round(2),
+        'Rent. Desde inicio actual': rng.normal(0.04, 0.09, rows).round(4),
+    })
+    clientes = pd.DataFrame({
+        'Cartera': [f"CA{c:07d}" for c in range(n_clients)],
+        'Cliente': [f"Cliente {c:06d}" for c in range(n_clients)],
+    })
+    return {'Contratos': contratos, 'Clientes': clientes}
+
+
+GENERATORS = {
+    'Performance': performance_frame,
+    'Generali': generali_frame,
+    'AXA': axa_workbook,
+}
+
+
+def write_input(data, path):
+    """Writes a synthetic frame (or AXA sheet dict) the way users upload it: .xlsx or .csv"""
+    path = Path(path)
+    if path.suffix.lower() == '.csv':
+        if isinstance(data, dict):
+            raise ValueError("Multi-sheet (AXA) inputs can only be written as .xlsx")
+        data.to_csv(path, index=False)
+        return path
+    sheets = data if isinstance(data, dict) else {'Sheet1': data}
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for sheet, frame in sheets.items():
+            frame.to_excel(writer, sheet_name=sheet, index=False)
+    return path
@@ -0,0 +1,376 @@
+import json
+import os
+import pickle
+import shutil
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+
+from .pdf_cache import default_cache_dir
+
+STATES = ("pending", "claimed", "done", "failed")
+BATCH_FILE = "batch.json"
+
+# A claimed task: `path` is its file under claimed/, `call` the pickled (function, args, attempts)
+Task = namedtuple('Task', ['batch', 'task_id', 'path', 'call'])
+
+
+def default_queue_dir():
+    """ATLAS_QUEUE_DIR if set, otherwise a folder of the local cache directory (single-host use)"""
+    return Path(os.environ.get("ATLAS_QUEUE_DIR", default_cache_dir() / "queue"))
+
+
+def _write_atomic(path, data):
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def _names(directory, suffix):
+    try:
+        return sorted(name for name in os.listdir(directory) if name.endswith(suffix))
+    except FileNotFoundError:
+        return []
+
+
+def _batch_names(directory):
+    """Batch folders of a queue directory, oldest first (their names start with the creation time)"""
+    try:
+        return sorted(entry.name for entry in os.scandir(directory) if entry.is_dir() and not entry.name.startswith("."))
+    except FileNotFoundError:
+        return []
+
+
+def _task_id(name):
+    """Task id of a file name under pending/ or claimed/ ('<id>.task' or '<id>.task.<owner>.reclaim')"""
+    return name.split(".", 1)[0]
+
+
+class TaskQueue:
+    """
+    Durable render queue in a plain directory, shared by the process that splits a batch into
+    per-agent tasks (render_pdfs with `queue`) and any number of workers (worker.py) on this
+    host or on others mounting the same volume. There is no broker: every state change is an
+    atomic rename, so exactly one worker claims each task.
+
+        <directory>/<batch>/batch.json            report type, host, creation time
+        <directory>/<batch>/pending/<task>.task   waiting: a pickled (function, args, attempts)
+        <directory>/<batch>/claimed/<task>.task   being rendered; its mtime is the worker's heartbeat
+        <directory>/<batch>/done/<task>.result    pickled return value
+        <directory>/<batch>/failed/<task>.json    last error, after `max_attempts` tries (or a task
+                                                  no worker could unpickle)
+
+    A failed task goes back to pending until it has been tried `max_attempts` times. A claimed
+    task whose heartbeat is older than `stale_seconds` (its worker died) is reclaimed the same way.
+    Tasks are pickles: only trusted hosts may write to the directory.
+    """
+
+    def __init__(self, directory=None, max_attempts=3, stale_seconds=120, worker_timeout=600, max_in_flight=256):
+        self.directory = Path(directory) if directory else default_queue_dir()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.stale_seconds = stale_seconds
+        # A submitting process gives up on its open tasks after this long without any worker progress
+        self.worker_timeout = worker_timeout
+        # Tasks render_pdfs keeps queued at once: PDFs are yielded in order, so finished ones wait in memory
+        self.max_in_flight = max_in_flight
+
+    def _batch_dir(self, batch):
+        return self.directory / batch
+
+    def create_batch(self, report_type=None):
+        batch = f"{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        batch_dir = self._batch_dir(batch)
+        for state in STATES:
+            (batch_dir / state).mkdir(parents=True)
+        info = {"report_type": report_type, "host": socket.gethostname(), "created": time.time()}
+        _write_atomic(batch_dir / BATCH_FILE, json.dumps(info).encode())
+        return batch
+
+    def submit(self, batch, task_id, fn, *args):
+        """Queues the call fn(*args); `fn` must be importable by the workers (a module-level function)"""
+        data = pickle.dumps((fn, args, 0), protocol=pickle.HIGHEST_PROTOCOL)
+        _write_atomic(self._batch_dir(batch) / "pending" / f"{task_id}.task", data)
+
+    def claim(self):
+        """The oldest pending task, now owned by the caller, or None if there is nothing to do"""
+        for batch in _batch_names(self.directory):
+            pending = self._batch_dir(batch) / "pending"
+            for name in _names(pending, ".task"):
+                claimed = self._batch_dir(batch) / "claimed" / name
+                try:
+                    # Heartbeat first: rename keeps the mtime, and an old one would look stale
+                    os.utime(pending / name)
+                    os.rename(pending / name, claimed)
+                    call = self._load(batch, _task_id(name), claimed)
+                except FileNotFoundError:
+                    continue  # another worker got it (or the batch was cancelled)
+                if call is not None:
+                    return Task(batch, _task_id(name), claimed, call)
+        return None
+
+    def _load(self, batch, task_id, path):
+        """
+        The pickled call in a task file this process owns. One that can't be loaded (e.g. a worker
+        running other code than the submitter) is failed right away and None returned.
+        """
+        data = path.read_bytes()
+        try:
+            return pickle.loads(data)
+        except Exception as e:
+            self._write_failure(batch, task_id, f"Task could not be loaded: {type(e).__name__}: {e}", 0)
+            path.unlink(missing_ok=True)
+            return None
+
+    @contextmanager
+    def heartbeat(self, task):
+        """Keeps touching the task's file while the caller works on it, so it isn't reclaimed"""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.stale_seconds / 4):
+                try:
+                    os.utime(task.path)
+                except FileNotFoundError:
+                    return
+
+        thread = threading.Thread(target=beat, name="atlas-queue-heartbeat", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, task, result):
+        batch_dir = self._batch_dir(task.batch)
+        try:
+            _write_atomic(batch_dir / "done" / f"{task.task_id}.result", pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+        except FileNotFoundError:
+            return  # batch removed (cancelled) while this task ran
+        task.path.unlink(missing_ok=True)
+
+    def fail(self, task, message):
+        """Puts the task back in pending, or into failed once it has had `max_attempts` tries"""
+        fn, args, attempts = task.call
+        attempts += 1
+        try:
+            if attempts < self.max_attempts:
+                retry = pickle.dumps((fn, args, attempts), protocol=pickle.HIGHEST_PROTOCOL)
+                _write_atomic(self._batch_dir(task.batch) / "pending" / f"{task.task_id}.task", retry)
+            else:
+                self._write_failure(task.batch, task.task_id, message, attempts)
+        except FileNotFoundError:
+            return
+        task.path.unlink(missing_ok=True)
+
+    def _write_failure(self, batch, task_id, message, attempts):
+        failure = {"error": message, "attempts": attempts}
+        _write_atomic(self._batch_dir(batch) / "failed" / f"{task_id}.json", json.dumps(failure).encode())
+
+    def reclaim_stale(self):
+        """
+        Returns tasks of workers that stopped heartbeating to pending (counting a try); how many.
+        Tasks left mid-reclaim by a reclaimer that died are picked up the same way once stale.
+        """
+        reclaimed = 0
+        deadline = time.time() - self.stale_seconds
+        for batch in _batch_names(self.directory):
+            claimed_dir = self._batch_dir(batch) / "claimed"
+            for name in _names(claimed_dir, ".task") + _names(claimed_dir, ".reclaim"):
+                path = claimed_dir / name
+                owned = claimed_dir / f"{_task_id(name)}.task.{uuid.uuid4().hex}.reclaim"
+                try:
+                    if path.stat().st_mtime >= deadline:
+                        continue
+                    os.rename(path, owned)  # only one reclaimer wins
+                    # Fresh mtime: the task only looks orphaned again if this reclaimer dies with it
+                    os.utime(owned)
+                    call = self._load(batch, _task_id(name), owned)
+                except FileNotFoundError:
+                    continue
+                if call is not None:
+                    self.fail(Task(batch, _task_id(name), owned, call), "Render worker stopped responding")
+                reclaimed += 1
+        return reclaimed
+
+    def status(self, batch):
+        """Completion view of one batch: report type, host, creation time and task count per state"""
+        batch_dir = self._batch_dir(batch)
+        try:
+            info = json.loads((batch_dir / BATCH_FILE).read_text())
+        except (OSError, ValueError):
+            info = {}
+        suffixes = {"pending": ".task", "claimed": ".task", "done": ".result", "failed": ".json"}
+        counts = {state: len(_names(batch_dir / state, suffix)) for state, suffix in suffixes.items()}
+        # A task being reclaimed is still open (see reclaim_stale)
+        counts["claimed"] += len(_names(batch_dir / "claimed", ".reclaim"))
+        return {"batch": batch, **info, **counts, "finished": counts["pending"] + counts["claimed"] == 0}
+
+    def batches(self):
+        """status() of every batch in the queue, oldest first"""
+        return [self.status(batch) for batch in _batch_names(self.directory)]
+
+    def wait(self, batch, timeout=None, poll_seconds=1.0):
+        """Blocks until no task of the batch is pending or claimed (or `timeout` passes); its status()"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = self.status(batch)
+            if status["finished"] or (deadline is not None and time.monotonic() >= deadline):
+                return status
+            time.sleep(poll_seconds)
+
+    def cancel(self, batch):
+        """Drops the batch's pending tasks; tasks already being rendered finish but are discarded"""
+        pending = self._batch_dir(batch) / "pending"
+        for name in _names(pending, ".task"):
+            (pending / name).unlink(missing_ok=True)
+
+    def remove(self, batch):
+        shutil.rmtree(self._batch_dir(batch), ignore_errors=True)
+
+    def closed(self, batch):
+        """Ids of the batch's tasks that are done or failed"""
+        batch_dir = self._batch_dir(batch)
+        done = _names(batch_dir / "done", ".result")
+        failed = _names(batch_dir / "failed", ".json")
+        return {name.rsplit(".", 1)[0] for name in done + failed}
+
+    def result(self, batch, task_id):
+        """('done', return value), ('failed', error message) or None while the task is still open"""
+        batch_dir = self._batch_dir(batch)
+        try:
+            return "done", pickle.loads((batch_dir / "done" / f"{task_id}.result").read_bytes())
+        except FileNotFoundError:
+            pass
+        try:
+            return "failed", json.loads((batch_dir / "failed" / f"{task_id}.json").read_text())["error"]
+        except FileNotFoundError:
+            return None
+
+    def executor(self, report_type=None):
+        return QueueExecutor(self, report_type)
+
+
+class TaskFailed(RuntimeError):
+    """A queued task that failed on every try, or that no worker finished in time"""
+
+
+class QueueExecutor:
+    """
+    Executor over one batch of a TaskQueue, standing in for the process pool of render_pdfs:
+    submit() queues a call and returns a Future, resolved by a polling thread once a worker
+    has finished (or given up on) it. Open Futures fail with TaskFailed when no worker picks
+    up any of them for the queue's `worker_timeout` seconds. The batch is removed on shutdown.
+    """
+
+    def __init__(self, queue, report_type=None, poll_seconds=0.2):
+        self.queue = queue
+        self.batch = queue.create_batch(report_type)
+        self.poll_seconds = poll_seconds
+        self._futures = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._poll, name="atlas-queue-poll", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args):
+        future = Future()
+        with self._lock:
+            # Zero-padded ids: workers claim in name order, so agents are rendered in job order
+            task_id = f"{self._next_id:08d}"
+            self._next_id += 1
+            self.queue.submit(self.batch, task_id, fn, *args)
+            self._futures[task_id] = future
+        return future
+
+    def _resolve(self, task_id, state, value):
+        with self._lock:
+            future = self._futures.pop(task_id, None)
+        if future is None or future.cancelled():
+            return
+        if state == "done":
+            future.set_result(value)
+        else:
+            future.set_exception(TaskFailed(value))
+
+    def _poll(self):
+        last_progress = time.monotonic()
+        while not self._stop.wait(self.poll_seconds):
+            with self._lock:
+                open_tasks = list(self._futures)
+            if not open_tasks:
+                last_progress = time.monotonic()
+                continue
+            for task_id in self.queue.closed(self.batch).intersection(open_tasks):
+                self._resolve(task_id, *self.queue.result(self.batch, task_id))
+                last_progress = time.monotonic()
+
+            if self.queue.status(self.batch)["claimed"]:
+                # Claimed tasks are heartbeating (or get reclaimed once stale): a worker is on it
+                last_progress = time.monotonic()
+            elif time.monotonic() - last_progress > self.queue.worker_timeout:
+                # Nobody is rendering this batch: fail what is left instead of blocking the run
+                self.queue.cancel(self.batch)
+                for task_id in open_tasks:
+                    self._resolve(task_id, "failed", "No render worker finished the task in time")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        if cancel_futures:
+            self.queue.cancel(self.batch)
+            with self._lock:
+                for future in self._futures.values():
+                    future.cancel()
+                self._futures.clear()
+        if wait:
+            for future in list(self._futures.values()):
+                try:
+                    future.result()
+                except Exception:
+                    pass
+        # Stop polling before the batch goes, so the thread never reads a half-removed batch
+        self._stop.set()
+        self._thread.join()
+        self.queue.remove(self.batch)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown(wait=True)
+        return False
+
+
+def run_worker(queue, poll_seconds=1.0, idle_exit=None, stop=None):
+    """
+    Claims and runs tasks until `stop` (a threading/multiprocessing Event) is set, or until the
+    queue has been empty for `idle_exit` seconds. Returns the number of tasks completed.
+    """
+    completed = 0
+    idle_since = time.monotonic()
+    while stop is None or not stop.is_set():
+        queue.reclaim_stale()
+        task = queue.claim()
+        if task is None:
+            if idle_exit is not None and time.monotonic() - idle_since >= idle_exit:
+                break
+            time.sleep(poll_seconds)
+            continue
+
+        fn, args, _ = task.call
+        try:
+            with queue.heartbeat(task):
+                result = fn(*args)
+        except Exception as e:
+            queue.fail(task, f"{type(e).__name__}: {e}")
+        else:
+            queue.complete(task, result)
+            completed += 1
+        idle_since = time.monotonic()
+    return completed
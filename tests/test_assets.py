@@ -0,0 +1,19 @@
+from PIL import Image
+
+from modules.assets import data_uri, load_asset
+
+
+def test_data_uri_loads_like_the_file(tmp_path):
+    logo = tmp_path / "logo.png"
+    Image.new("RGB", (40, 20), "red").save(logo)
+    url = logo.as_uri()
+
+    inlined = data_uri(url)
+    assert inlined.startswith("data:image/png;base64,")
+    assert load_asset(inlined) == load_asset(url)
+
+
+def test_missing_asset_is_left_as_is(tmp_path):
+    url = (tmp_path / "missing.png").as_uri()
+    assert load_asset(url) is None
+    assert data_uri(url) == url
@@ -0,0 +1,12 @@
+from pathlib import Path
+
+from cli import output_folders
+
+
+def test_output_folders_are_unique():
+    inputs = [Path("a/export.csv"), Path("b/export.csv"), Path("export.xlsx"), Path("generali.xlsx")]
+    assert output_folders(inputs) == ["export_csv_1", "export_csv_2", "export_xlsx", "generali"]
+
+
+def test_output_folders_keep_distinct_stems():
+    assert output_folders([Path("axa.xlsx"), Path("generali.csv")]) == ["axa", "generali"]
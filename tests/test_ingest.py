@@ -0,0 +1,42 @@
+import pandas as pd
+
+from modules.ingest import load_upload, partition_csv
+from modules.registry import REPORTS_BY_NAME
+
+
+def _performance_csv(path, agents):
+    pd.DataFrame({
+        'Agent': agents,
+        'Name': [f"Client {i}" for i in range(len(agents))],
+        'Account Number': range(len(agents)),
+        'Portfolio': 'Growth',
+        'Date': '2024-01-31',
+        'Net Deposit': 100.0,
+        'Balance': 110.0,
+        'Performance': 0.1,
+    }).to_csv(path, index=False)
+    return path
+
+
+def test_partition_csv_mixed_agent_codes(tmp_path):
+    # Numeric codes fill the first chunks; a text code only shows up in the last one
+    agents = ['1001', '1002'] * 300 + ['1001', 'AG-7'] * 50
+    path = _performance_csv(tmp_path / "performance.csv", agents)
+
+    partitions = partition_csv(path, 'Performance', REPORTS_BY_NAME['Performance'].agent_columns, chunk_rows=250)
+    try:
+        expected = load_upload(path, 'Performance')['Agent'].value_counts()
+        assert partitions.counts.to_dict() == {'1001': 350, '1002': 300, 'AG-7': 50}
+        assert partitions.counts.to_dict() == expected.to_dict()
+        rows = partitions.read('1001')
+        assert len(rows) == 350
+        assert rows.index.is_monotonic_increasing
+    finally:
+        partitions.close()
+
+
+def test_load_upload_reads_agent_codes_as_text(tmp_path):
+    path = _performance_csv(tmp_path / "performance.csv", ['007', '1001', '007'])
+    df = load_upload(path, 'Performance')
+    assert list(df['Agent'].astype(str)) == ['007', '1001', '007']
+    assert load_upload(path)['Agent'].tolist() == df['Agent'].tolist()
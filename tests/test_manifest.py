@@ -0,0 +1,52 @@
+from collections import namedtuple
+
+import pytest
+
+from modules.manifest import IncrementalOutput, OutputBusy
+
+# The RenderJob fields IncrementalOutput reads
+Job = namedtuple('Job', ['agent', 'filename', 'cache_key'])
+
+
+def _run(directory, pdfs, stop_after=None):
+    """One incremental run over {agent: pdf bytes}; stops without finish() after `stop_after` writes"""
+    with IncrementalOutput(directory) as output:
+        for i, (agent, pdf_bytes) in enumerate(pdfs.items()):
+            job = Job(agent, f"{agent}.pdf", pdf_bytes.decode())
+            if output.unchanged(job):
+                continue
+            output.record(job)
+            output.write(job.filename, pdf_bytes)
+            if stop_after is not None and i + 1 == stop_after:
+                return output
+        output.finish()
+    return output
+
+
+def test_unchanged_agents_are_reused(tmp_path):
+    _run(tmp_path, {'A': b'a1', 'B': b'b1'})
+    output = _run(tmp_path, {'A': b'a1', 'B': b'b2'})
+    assert output.summary() == {'written': 1, 'reused': 1, 'removed': 0}
+    assert (tmp_path / 'B.pdf').read_bytes() == b'b2'
+
+
+def test_departed_agents_are_removed(tmp_path):
+    _run(tmp_path, {'A': b'a1', 'B': b'b1'})
+    output = _run(tmp_path, {'A': b'a1'})
+    assert output.removed == 1
+    assert not (tmp_path / 'B.pdf').exists()
+
+
+def test_file_overwritten_by_unfinished_run_is_rendered_again(tmp_path):
+    _run(tmp_path, {'A': b'a1', 'B': b'b1'})
+    _run(tmp_path, {'A': b'a2-longer', 'B': b'b2'}, stop_after=1)
+    output = _run(tmp_path, {'A': b'a1', 'B': b'b1'})
+    assert output.summary() == {'written': 1, 'reused': 1, 'removed': 0}
+    assert (tmp_path / 'A.pdf').read_bytes() == b'a1'
+
+
+def test_directory_is_exclusive(tmp_path):
+    with IncrementalOutput(tmp_path):
+        with pytest.raises(OutputBusy):
+            IncrementalOutput(tmp_path)
+    IncrementalOutput(tmp_path).close()
@@ -0,0 +1,223 @@
+import json
+import os
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+from modules.task_queue import TaskFailed, TaskQueue, run_worker
+
+
+def double(value):
+    return value * 2
+
+
+def explode(value):
+    raise ValueError(f"bad {value}")
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return TaskQueue(tmp_path / "queue", max_attempts=2, stale_seconds=60)
+
+
+def _age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def _submit_unloadable(queue, batch, task_id):
+    """Queues a call to a function of a module the worker doesn't have"""
+    module = types.ModuleType("atlas_missing_module")
+
+    def render(value):
+        return value
+
+    render.__module__ = module.__name__
+    render.__qualname__ = "render"
+    module.render = render
+    sys.modules[module.__name__] = module
+    try:
+        queue.submit(batch, task_id, render, 1)
+    finally:
+        del sys.modules[module.__name__]
+
+
+def test_claim_complete(queue):
+    batch = queue.create_batch("Generali")
+    queue.submit(batch, "00000000", double, 21)
+
+    task = queue.claim()
+    assert (task.batch, task.task_id) == (batch, "00000000")
+    assert queue.status(batch)["claimed"] == 1
+    assert queue.claim() is None
+
+    fn, args, attempts = task.call
+    queue.complete(task, fn(*args))
+    status = queue.status(batch)
+    assert (status["report_type"], status["done"], status["finished"]) == ("Generali", 1, True)
+    assert queue.closed(batch) == {"00000000"}
+    assert queue.result(batch, "00000000") == ("done", 42)
+
+
+def test_claim_in_submission_order(queue):
+    batch = queue.create_batch()
+    for i in range(3):
+        queue.submit(batch, f"{i:08d}", double, i)
+    assert [queue.claim().task_id for _ in range(3)] == ["00000000", "00000001", "00000002"]
+
+
+def test_concurrent_claims_take_each_task_once(queue):
+    batch = queue.create_batch()
+    for i in range(200):
+        queue.submit(batch, f"{i:08d}", double, i)
+    claimed = []
+
+    def claim_all():
+        while (task := queue.claim()) is not None:
+            claimed.append(task.task_id)
+
+    threads = [threading.Thread(target=claim_all) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == [f"{i:08d}" for i in range(200)]
+
+
+def test_fail_retries_then_fails(queue):
+    batch = queue.create_batch()
+    queue.submit(batch, "00000000", explode, 1)
+
+    queue.fail(queue.claim(), "ValueError: bad 1")
+    status = queue.status(batch)
+    assert (status["pending"], status["claimed"], status["failed"]) == (1, 0, 0)
+
+    task = queue.claim()
+    assert task.call[2] == 1
+    queue.fail(task, "ValueError: bad 1")
+    status = queue.status(batch)
+    assert (status["pending"], status["failed"], status["finished"]) == (0, 1, True)
+    assert queue.result(batch, "00000000") == ("failed", "ValueError: bad 1")
+    failure = json.loads((queue.directory / batch / "failed" / "00000000.json").read_text())
+    assert failure["attempts"] == 2
+
+
+def test_reclaim_stale(queue):
+    batch = queue.create_batch()
+    queue.submit(batch, "00000000", double, 1)
+    task = queue.claim()
+
+    assert queue.reclaim_stale() == 0
+    _age(task.path, 120)
+    assert queue.reclaim_stale() == 1
+    status = queue.status(batch)
+    assert (status["pending"], status["claimed"]) == (1, 0)
+    assert queue.claim().call[2] == 1
+
+    # Out of tries: the second stale claim fails the task
+    _age(queue.directory / batch / "claimed" / "00000000.task", 120)
+    assert queue.reclaim_stale() == 1
+    assert queue.result(batch, "00000000") == ("failed", "Render worker stopped responding")
+
+
+def test_heartbeat_keeps_task_claimed(tmp_path):
+    queue = TaskQueue(tmp_path / "queue", stale_seconds=0.2)
+    batch = queue.create_batch()
+    queue.submit(batch, "00000000", double, 1)
+    task = queue.claim()
+    with queue.heartbeat(task):
+        time.sleep(0.4)
+        assert time.time() - task.path.stat().st_mtime < 0.2
+        assert queue.reclaim_stale() == 0
+
+
+def test_orphaned_reclaim_is_open_and_reclaimed(queue):
+    batch = queue.create_batch()
+    queue.submit(batch, "00000000", double, 1)
+    task = queue.claim()
+    # A reclaimer that died between taking the task and putting it back
+    orphan = task.path.with_name("00000000.task.0123abcd.reclaim")
+    os.rename(task.path, orphan)
+
+    status = queue.status(batch)
+    assert (status["claimed"], status["finished"]) == (1, False)
+    _age(orphan, 120)
+    assert queue.reclaim_stale() == 1
+    assert not orphan.exists()
+    assert queue.status(batch)["pending"] == 1
+
+
+def test_unloadable_task_fails_on_claim(queue):
+    batch = queue.create_batch()
+    _submit_unloadable(queue, batch, "00000000")
+    queue.submit(batch, "00000001", double, 2)
+
+    task = queue.claim()
+    assert task.task_id == "00000001"
+    state, message = queue.result(batch, "00000000")
+    assert state == "failed" and "ModuleNotFoundError" in message
+    status = queue.status(batch)
+    assert (status["claimed"], status["failed"]) == (1, 1)
+
+
+def test_unloadable_task_fails_on_reclaim(queue):
+    batch = queue.create_batch()
+    _submit_unloadable(queue, batch, "00000000")
+    pending = queue.directory / batch / "pending" / "00000000.task"
+    claimed = queue.directory / batch / "claimed" / "00000000.task"
+    os.rename(pending, claimed)  # claimed by a worker that had the module, then died
+    _age(claimed, 120)
+
+    assert queue.reclaim_stale() == 1
+    assert os.listdir(claimed.parent) == []
+    status = queue.status(batch)
+    assert (status["failed"], status["finished"]) == (1, True)
+    assert "ModuleNotFoundError" in queue.result(batch, "00000000")[1]
+
+
+def test_run_worker(queue):
+    batch = queue.create_batch()
+    queue.submit(batch, "00000000", double, 1)
+    queue.submit(batch, "00000001", explode, 2)
+    _submit_unloadable(queue, batch, "00000002")
+
+    assert run_worker(queue, poll_seconds=0.01, idle_exit=0) == 1
+    assert queue.result(batch, "00000000") == ("done", 2)
+    assert queue.result(batch, "00000001") == ("failed", "ValueError: bad 2")
+    assert queue.result(batch, "00000002")[0] == "failed"
+    assert queue.status(batch)["finished"]
+
+
+def test_executor(queue):
+    stop = threading.Event()
+    worker = threading.Thread(target=run_worker, args=(queue,), kwargs={"poll_seconds": 0.01, "stop": stop})
+    worker.start()
+    try:
+        with queue.executor("Performance") as executor:
+            done, failed = executor.submit(double, 4), executor.submit(explode, 5)
+            assert done.result(timeout=10) == 8
+            with pytest.raises(TaskFailed, match="bad 5"):
+                failed.result(timeout=10)
+        assert queue.batches() == []
+    finally:
+        stop.set()
+        worker.join()
+
+
+def test_executor_times_out_without_workers(tmp_path):
+    queue = TaskQueue(tmp_path / "queue", worker_timeout=0.3)
+    executor = queue.executor()
+    future = executor.submit(double, 1)
+    with pytest.raises(TaskFailed, match="No render worker"):
+        future.result(timeout=10)
+    executor.shutdown()
+
+
+def test_stray_files_are_not_batches(queue):
+    (queue.directory / "notes.txt").write_text("not a batch")
+    assert queue.claim() is None
+    assert queue.reclaim_stale() == 0
+    assert queue.batches() == []
@@ -0,0 +1,90 @@
+"""
+Render worker for the shared task queue (modules/task_queue.py). Start any number of these,
+on this host or on others mounting the same queue directory:
+
+    python worker.py --queue /mnt/atlas/queue --processes 8
+
+then generate with the same queue, e.g. `python cli.py contratos.xlsx -o out/ --queue /mnt/atlas/queue`.
+The workers render the per-agent layouts and the generating process writes the PDFs as usual.
+
+    python worker.py --queue /mnt/atlas/queue --status
+
+prints every batch in the queue with its pending, claimed, done and failed task counts.
+"""
+import argparse
+import multiprocessing
+import signal
+import sys
+from pathlib import Path
+
+from modules.task_queue import TaskQueue, default_queue_dir, run_worker
+
+
+def _worker_process(args, stop):
+    # Ctrl-C reaches the whole process group: leave it to the parent, which stops the workers
+    # through `stop` once they have finished the task in hand
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    queue = TaskQueue(args.queue, max_attempts=args.max_attempts, stale_seconds=args.stale_seconds)
+    run_worker(queue, poll_seconds=args.poll, idle_exit=args.idle_exit, stop=stop)
+
+
+def print_status(queue):
+    batches = queue.batches()
+    if not batches:
+        print(f"{queue.directory}: no batches")
+    for status in batches:
+        state = "finished" if status["finished"] else "running"
+        print(
+            f"{status['batch']} {status.get('report_type') or '-'} from {status.get('host', '?')}: {state}, "
+            f"{status['pending']} pending, {status['claimed']} claimed, {status['done']} done, {status['failed']} failed"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Render agent PDFs queued by the app or cli.py.")
+    parser.add_argument("--queue", type=Path, default=None,
+                        help=f"queue directory shared with the generating host (default: {default_queue_dir()})")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes on this host (default: 1)")
+    parser.add_argument("--max-attempts", type=int, default=3, help="tries per task before it is failed (default: 3)")
+    parser.add_argument("--stale-seconds", type=int, default=120,
+                        help="reclaim tasks whose worker has not reported for this long (default: 120)")
+    parser.add_argument("--poll", type=float, default=1.0, help="seconds between checks of an empty queue")
+    parser.add_argument("--idle-exit", type=float, default=None,
+                        help="exit after the queue has been empty for this many seconds (default: run until stopped)")
+    parser.add_argument("--status", action="store_true", help="print the queue's batches and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.status:
+        print_status(TaskQueue(args.queue))
+        return 0
+
+    # 'spawn' like the render pool: each worker imports the report modules fresh
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    processes = [
+        ctx.Process(target=_worker_process, args=(args, stop), name=f"atlas-worker-{i}", daemon=True)
+        for i in range(max(1, args.processes))
+    ]
+    for process in processes:
+        process.start()
+    # A stopped service (SIGTERM) winds the workers down too instead of orphaning them
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    print(f"{len(processes)} worker(s) on {TaskQueue(args.queue).directory}")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Workers finish the task in hand, then exit. A second Ctrl-C stops them at once (they are
+        # daemons); the tasks they drop are reclaimed once stale.
+        print("Stopping after the tasks in hand (Ctrl-C again to abort them)")
+        stop.set()
+        for process in processes:
+            process.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())